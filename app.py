@@ -1,202 +1,217 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, send_file
-import pandas as pd
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, send_file, g, has_request_context, stream_with_context
 import os
 import sqlite3
 import json
 import uuid
+import base64
+import random
 from datetime import datetime
-from io import BytesIO
+import tempfile
+import time
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.db import ConnectionPool
+from utils.search import register_search_functions, search_clients
+from utils.normalize import format_phone_number, normalize_city
+from utils.migrations import apply_migrations, schema_pending
+from utils.ingest import INGEST_WORKERS, INGEST_MODES
+from utils.jobs import JobQueue
+from utils.uploads import store_upload, register_upload, list_uploads, delete_upload, UploadConflict
+from utils.profiles import client_profile
+from utils.rollups import STATS_SQL
+from utils.versions import table_versions, data_etag
+from utils.cache import QueryCache
+from utils.metrics import Metrics
+from utils.slow_queries import SlowQueryLog
+from utils.profiler import SamplingProfiler, profile_name, save_profile, list_profiles, profile_path
+from utils.fastjson import FastJSONProvider, STREAM_BATCH, dumps_bytes, iter_json_array, iter_json_envelope, iter_ndjson
+from utils.client_json import client_sql, splice_members, splice_nested, unspliced
+from utils.export import resolve_columns, iter_export_rows, stream_csv, write_xlsx
+from utils.query_plans import hot_query
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.secret_key = 'nextis_secret_key_change_in_production'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['PORTFOLIO_FOLDER'] = os.path.join('static', 'portfolio_uploads')
-app.config['DB_NAME'] = 'nexsis.db'
+app.config['DB_NAME'] = os.environ.get('NEXTIS_DB', 'nexsis.db')
+app.config['INGEST_WORKERS'] = INGEST_WORKERS
+app.config['JOB_WORKERS'] = 1
+app.config['QUERY_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+app.config['QUERY_CACHE_TTL'] = 300
+app.config['METRICS_DIR'] = os.environ.get('NEXTIS_METRICS_DIR', 'metrics')
+app.config['METRICS_TOKEN'] = os.environ.get('NEXTIS_METRICS_TOKEN')
+app.config['SLOW_QUERY_LOG'] = os.path.join('logs', 'slow_queries.jsonl')
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('NEXTIS_SLOW_QUERY_MS', 100))
+app.config['PROFILE_DIR'] = os.environ.get('NEXTIS_PROFILE_DIR', 'profiles')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('NEXTIS_PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_INTERVAL'] = 0.005
+app.config['PROFILE_KEEP'] = 200
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['PORTFOLIO_FOLDER'], exist_ok=True)
 
+db_pool = ConnectionPool(app.config['DB_NAME'])
+db_pool.on_connect(register_search_functions)
+
 def get_db_connection():
-    conn = sqlite3.connect(app.config['DB_NAME'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return this thread's pooled connection (conn.close() just releases it)"""
+    return db_pool.connection()
 
-def init_db():
-    conn = get_db_connection()
-    conn.executescript('''
-        CREATE TABLE IF NOT EXISTS clients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            business_name TEXT,
-            location TEXT,
-            phone TEXT,
-            anydesk TEXT,
-            source_file TEXT,
-            extra_data TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            role TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            rating INTEGER,
-            comment TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            description TEXT,
-            image_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS project_images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project_id INTEGER,
-            image_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
-        );
-        CREATE TABLE IF NOT EXISTS contact_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            phone TEXT,
-            message TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    ''')
-    conn.commit()
-    conn.close()
+@app.teardown_appcontext
+def release_db_connection(exc):
+    db_pool.release()
 
-def migrate_schema():
-    """Ensure extra_data column exists"""
-    conn = get_db_connection()
-    try:
-        conn.execute("ALTER TABLE clients ADD COLUMN extra_data TEXT")
-    except sqlite3.OperationalError:
-        pass 
-    conn.commit()
-    conn.close()
+# Instrumentation: per-endpoint latency, response size and SQL time, shared
+# across workers through METRICS_DIR (utils/metrics.py) and served at
+# /metrics; statements slower than SLOW_QUERY_MS go to the slow-query log
+# with their query plan (utils/slow_queries.py).
+metrics = Metrics(app.config['METRICS_DIR'])
+slow_queries = SlowQueryLog(app.config['SLOW_QUERY_LOG'], threshold_ms=app.config['SLOW_QUERY_MS'])
 
-def format_phone_number(phone):
-    """Format phone number to Israeli standard"""
-    if pd.isna(phone) or phone == 'אין':
-        return 'אין'
-    
-    # Remove non-digits
-    digits = ''.join(filter(str.isdigit, str(phone)))
-    
-    # Handle country code
-    if digits.startswith('972'):
-        digits = '0' + digits[3:]
-    
-    # Standard format: 05X-XXXXXXX
-    if len(digits) == 10 and digits.startswith('05'):
-        return f"{digits[:3]}-{digits[3:]}"
-        
-    # Landline: 0X-XXXXXXX
-    if len(digits) == 9 and digits.startswith('0'):
-        return f"{digits[:2]}-{digits[2:]}"
-        
-    return phone
+@db_pool.on_statement
+def observe_statement(conn, sql, parameters, seconds, rows, many):
+    route = None
+    if has_request_context():
+        route = request.endpoint or 'unmatched'
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + seconds
+    if slow_queries.observe(conn, sql, parameters, seconds, rows, many, route):
+        metrics.inc('nextis_slow_queries_total', {'endpoint': route or 'background'})
 
-def migrate_phones():
-    """Update all existing phones in DB"""
-    conn = get_db_connection()
-    try:
-        clients = conn.execute("SELECT id, phone FROM clients").fetchall()
-        for client in clients:
-            old_phone = client['phone']
-            new_phone = format_phone_number(old_phone)
-            if old_phone != new_phone:
-                conn.execute("UPDATE clients SET phone = ? WHERE id = ?", (new_phone, client['id']))
-        conn.commit()
-    except Exception as e:
-        print(f"Migration error: {e}")
-    finally:
-        conn.close()
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Initialize/Update DB on startup
-init_db()
-migrate_schema()
-migrate_phones()
+# Request profiling (utils/profiler.py): an admin adds `X-Profile: 1` or
+# `?_profile=1` to a request, or PROFILE_SAMPLE_RATE picks a fraction of all
+# requests. Disabled, this is one header/argument lookup per request.
+@app.before_request
+def start_profiler():
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    requested = 'X-Profile' in request.headers or '_profile' in request.args
+    if requested:
+        if 'role' not in session or session['role'] != 'admin':
+            return
+    elif not (rate and random.random() < rate):
+        return
+    g.profiler = SamplingProfiler(interval=app.config['PROFILE_INTERVAL']).start()
+
+def _profile_meta(status):
+    return {'endpoint': request.endpoint, 'method': request.method, 'path': request.full_path.rstrip('?'), 'status': status}
+
+@app.after_request
+def attach_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    name = profile_name(request.endpoint)
+    meta = _profile_meta(response.status_code)
+    # Saved when the response is closed, so streamed bodies (exports) are included
+    response.call_on_close(lambda: save_profile(app.config['PROFILE_DIR'], name, profiler, meta, app.config['PROFILE_KEEP']))
+    response.headers['X-Profile-Name'] = name
+    return response
 
-def normalize_city(city):
-    """Normalize city names"""
-    city = str(city).strip()
-    if 'באקה' in city:
-        return 'באקה אל גרבייה'
-    return city
+@app.teardown_request
+def save_failed_profile(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        save_profile(app.config['PROFILE_DIR'], profile_name(request.endpoint), profiler, _profile_meta(500), app.config['PROFILE_KEEP'])
 
-def process_excel(file_path):
-    """Process uploaded Excel file"""
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    labels = {'endpoint': endpoint}
+    metrics.inc('nextis_http_requests_total', {**labels, 'method': request.method, 'status': response.status_code})
+    metrics.observe('nextis_http_request_duration_seconds', time.perf_counter() - started, labels)
+    if not response.is_streamed and response.content_length is not None:
+        metrics.observe('nextis_http_response_bytes', response.content_length, labels)
+    metrics.inc('nextis_sql_queries_total', labels, g.get('sql_queries', 0))
+    metrics.inc('nextis_sql_seconds_total', labels, g.get('sql_seconds', 0.0))
+    metrics.observe('nextis_sql_request_seconds', g.get('sql_seconds', 0.0), labels)
     try:
-        if file_path.endswith('.csv'):
-             df = pd.read_csv(file_path)
-        else:
-             df = pd.read_excel(file_path)
-    except Exception as e:
-        raise ValueError(f"Could not read file: {e}")
+        metrics.maybe_flush()
+    except OSError as e:
+        # Counts stay in memory for the next flush; never fail the request
+        print(f"Error writing metrics: {e}")
+    return response
 
-    df.columns = df.columns.str.strip()
-    
-    # Column mapping with Priority Logic
-    rename_map = {}
-    used_cols = set()
-    
-    # Priority configurations: Target -> List of Keywords (High priority first)
-    priorities = {
-        'location': ['עיר', 'city', 'ישוב', 'יישוב', 'מיקום', 'location', 'כתובת', 'address', 'מקום'],
-        'anydesk': ['anydesk', 'אנידסק'],
-        'phone': ['phone', 'mobile', 'cell', 'tel', 'טלפון', 'נייד', 'פלאפון'],
-        'business_name': ['שם עסק', 'שם העסק', 'עסק', 'business', 'company', 'name', 'שם', 'לקוח', 'client']
-    }
-    
-    for target, keywords in priorities.items():
-        found_col = None
-        for kw in keywords:
-            for col in df.columns:
-                col_lower = str(col).lower()
-                if col in used_cols: continue
-                
-                # Check for keyword match
-                if kw in col_lower:
-                    found_col = col
-                    break
-            if found_col: break
-        
-        if found_col:
-            rename_map[found_col] = target
-            used_cols.add(found_col)
-
-    if rename_map:
-        df.rename(columns=rename_map, inplace=True)
-    
-        # Store all data as JSON before filtering
-    df_filled = df.fillna('')
-    # Convert all columns to string to avoid serialization issues
-    df_filled = df_filled.astype(str)
-    df['extra_data'] = df_filled.apply(lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1)
-
-    # Fill missing columns for SQL schema
-    for col in ['location', 'anydesk', 'phone', 'business_name']:
-        if col not in df.columns:
-            df[col] = 'אין'
-    
-    # Select columns including extra_data
-    df = df[['business_name', 'location', 'phone', 'anydesk', 'extra_data']]
-    
-    # Normalize locations and format phones
-    df['location'] = df['location'].apply(normalize_city)
-    df['phone'] = df['phone'].apply(format_phone_number)
-    
-    return df
+# Read helpers decorated with @query_cache.cached(<tables>) are answered from
+# memory until one of their tables changes (utils/cache.py).
+query_cache = QueryCache(
+    max_bytes=app.config['QUERY_CACHE_MAX_BYTES'],
+    ttl=app.config['QUERY_CACHE_TTL'],
+    version_source=lambda tables: table_versions(get_db_connection(), *tables)
+)
+
+# Conditional GETs: endpoints marked with @depends_on(...) get an ETag built
+# from the change counters of the tables they read (utils/versions.py), so an
+# unchanged response is answered with 304 before the view runs at all.
+_endpoint_tables = {}
+
+def depends_on(*tables):
+    def decorator(view):
+        _endpoint_tables[view.__name__] = tables
+        return view
+    return decorator
+
+@app.before_request
+def check_data_etag():
+    tables = _endpoint_tables.get(request.endpoint)
+    if request.method != 'GET' or not tables:
+        return None
+    args = sorted(request.args.items(multi=True))
+    g.data_etag = data_etag(get_db_connection(), tables, request.endpoint, request.view_args, args, session.get('role'))
+    if g.data_etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(g.data_etag)
+        return response
+    return None
+
+@app.after_request
+def set_data_etag(response):
+    etag = g.pop('data_etag', None)
+    if etag and response.status_code == 200:
+        response.set_etag(etag)
+        response.headers.setdefault('Cache-Control', 'no-cache')
+    return response
+
+# Schema changes are applied once per deploy by `python manage.py migrate`
+# (utils/migrations.py); a worker only checks that nothing is pending, so it
+# boots in constant time however large the database is. `python app.py` and
+# NEXTIS_AUTO_MIGRATE=1 still migrate on start, for local development.
+# Under `python app.py` the ingest pool's spawn workers import this module
+# again as __mp_main__; they only parse files, so they skip the check.
+SPAWNED_WORKER = __name__ == '__mp_main__'
+_pending = [] if SPAWNED_WORKER else schema_pending(get_db_connection())
+if _pending:
+    if __name__ == '__main__' or os.environ.get('NEXTIS_AUTO_MIGRATE') == '1':
+        apply_migrations(get_db_connection())
+    else:
+        raise RuntimeError(
+            f"Database {app.config['DB_NAME']} has {len(_pending)} pending migration(s) "
+            f"(first: {_pending[0].version} {_pending[0].name}); run `python manage.py migrate` first"
+        )
+
+# Uploads are imported in the background (utils/jobs.py). One job thread is
+# enough: SQLite has a single writer and each job parses in a process pool.
+# Importing the app only queues jobs; the serving process starts the threads
+# itself (the __main__ block below, gunicorn.conf.py for gunicorn workers),
+# so manage.py, tests and benchmarks never run imports behind their back.
+def job_finished(job_id):
+    query_cache.invalidate('clients')
+    job = job_queue.get(job_id)
+    if job:
+        metrics.inc('nextis_ingest_rows_inserted_total', value=job['rows_inserted'])
+        metrics.inc('nextis_ingest_files_total', {'status': 'failed'}, len(job['errors']))
+        metrics.inc('nextis_ingest_files_total', {'status': 'imported'}, job['files_done'] - len(job['errors']))
+
+job_queue = JobQueue(db_pool, workers=app.config['JOB_WORKERS'], ingest_workers=app.config['INGEST_WORKERS'],
+                     on_finished=job_finished)
+
+USER_BY_NAME_SQL = hot_query('login', 'SELECT * FROM users WHERE username = ?', ('admin',))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -205,7 +220,7 @@ def login():
         password = request.form['password']
         
         conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        user = conn.execute(USER_BY_NAME_SQL, (username,)).fetchone()
         conn.close()
         
         if user and check_password_hash(user['password'], password):
@@ -259,7 +274,10 @@ def admin_dashboard():
         return redirect(url_for('login'))
     return render_template('dashboard.html', username=session['username'])
 
+REVIEWS_SQL = hot_query('reviews', 'SELECT * FROM reviews ORDER BY id DESC', scan_ok=True)
+
 @app.route('/api/reviews', methods=['GET', 'POST'])
+@depends_on('reviews')
 def handle_reviews():
     conn = get_db_connection()
     if request.method == 'POST':
@@ -270,11 +288,37 @@ def handle_reviews():
         conn.close()
         return jsonify({'success': True})
     
-    reviews = conn.execute('SELECT * FROM reviews ORDER BY id DESC').fetchall()
+    reviews = conn.execute(REVIEWS_SQL).fetchall()
     conn.close()
     return jsonify([dict(r) for r in reviews])
 
+# Projects with their images as one JSON array, newest project first
+PROJECTS_JSON_SQL = '''
+    SELECT json_group_array(json(project)) FROM (
+        SELECT json_object(
+            'id', p.id, 'title', p.title, 'description', p.description,
+            'image_url', p.image_url, 'created_at', p.created_at,
+            'images', (
+                SELECT json_group_array(json_object(
+                    'id', i.id, 'project_id', i.project_id,
+                    'image_url', i.image_url, 'created_at', i.created_at))
+                FROM (SELECT * FROM project_images WHERE project_id = p.id ORDER BY id) AS i
+            )
+        ) AS project
+        FROM projects AS p ORDER BY p.id DESC
+    )
+'''
+hot_query('projects', PROJECTS_JSON_SQL, scan_ok=True)
+
+# Serialized GET /api/projects: {'version', 'body'}. Checked against
+# table_versions on every request, so writes from other workers are seen too.
+_projects_cache = {}
+
+def invalidate_projects_cache():
+    _projects_cache.clear()
+
 @app.route('/api/projects', methods=['GET', 'POST'])
+@depends_on('projects', 'project_images')
 def handle_projects():
     conn = get_db_connection()
     if request.method == 'POST':
@@ -312,18 +356,23 @@ def handle_projects():
         
         conn.commit()
         conn.close()
+        invalidate_projects_cache()
         return jsonify({'success': True})
     
-    projects_rows = conn.execute('SELECT * FROM projects ORDER BY id DESC').fetchall()
-    projects = []
-    for p in projects_rows:
-        project = dict(p)
-        images = conn.execute('SELECT * FROM project_images WHERE project_id = ?', (project['id'],)).fetchall()
-        project['images'] = [dict(img) for img in images]
-        projects.append(project)
-        
+    # Public landing page: the whole portfolio is one query, serialized once
+    # per change to projects/project_images and then served from memory
+    # (ETag/304 come from @depends_on).
+    version = table_versions(conn, 'projects', 'project_images')
+    cached = _projects_cache
+    if cached.get('version') != version:
+        cached = {'version': version, 'body': conn.execute(PROJECTS_JSON_SQL).fetchone()[0]}
+        _projects_cache.clear()
+        _projects_cache.update(cached)
     conn.close()
-    return jsonify(projects)
+    
+    return Response(cached['body'], mimetype='application/json')
+
+PROJECT_IMAGES_SQL = hot_query('project_images', 'SELECT image_url FROM project_images WHERE project_id = ?', (1,))
 
 @app.route('/api/projects/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
@@ -331,7 +380,7 @@ def delete_project(project_id):
         return jsonify({'error': 'Unauthorized'}), 403
         
     conn = get_db_connection()
-    images = conn.execute('SELECT image_url FROM project_images WHERE project_id = ?', (project_id,)).fetchall()
+    images = conn.execute(PROJECT_IMAGES_SQL, (project_id,)).fetchall()
     
     for img in images:
         try:
@@ -344,6 +393,7 @@ def delete_project(project_id):
     conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
     conn.commit()
     conn.close()
+    invalidate_projects_cache()
     return jsonify({'success': True})
 
 @app.route('/api/projects/<int:project_id>', methods=['POST'])
@@ -377,6 +427,7 @@ def update_project(project_id):
 
     conn.commit()
     conn.close()
+    invalidate_projects_cache()
     return jsonify({'success': True})
 
 @app.route('/api/portfolio/images/<int:image_id>', methods=['DELETE'])
@@ -405,6 +456,7 @@ def delete_portfolio_image(image_id):
             
         conn.commit()
     conn.close()
+    invalidate_projects_cache()
     return jsonify({'success': True})
 
 @app.route('/')
@@ -420,36 +472,63 @@ def upload_file():
     if not files or files[0].filename == '':
         return jsonify({'error': 'No files selected'}), 400
     
-    conn = get_db_connection()
-    added_count = 0
+    # mode=sync: the file is a new version of one imported before under the
+    # same name; only changed rows are written (key_column: optional identity)
+    mode = request.form.get('mode', 'append')
+    if mode not in INGEST_MODES:
+        return jsonify({'error': f'Invalid mode: {mode}'}), 400
+    options = {'mode': mode}
+    if request.form.get('key_column', '').strip():
+        options['key_column'] = request.form['key_column'].strip()
     
+    saved = []
+    duplicates = []
+    conn = get_db_connection()
     for file in files:
         if file:
             original_filename = file.filename
-            # Use UUID for safe storage
-            ext = os.path.splitext(original_filename)[1]
-            safe_filename = f"{uuid.uuid4()}{ext}"
-            
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], safe_filename)
-            file.save(filepath)
-            
-            try:
-                df = process_excel(filepath)
-                df['source_file'] = original_filename
-                
-                # Append to DB
-                df.to_sql('clients', conn, if_exists='append', index=False)
-                added_count += len(df)
-            except Exception as e:
-                return jsonify({'error': f'Error in {filename}: {str(e)}'}), 500
-    
+            # Stored by content hash (utils/uploads.py); a file that was
+            # already imported is recognized here and not parsed again,
+            # unless it is synced back to (mode=sync).
+            sha256, stored_path, size, stored_size = store_upload(file.stream, app.config['UPLOAD_FOLDER'], original_filename)
+            existing = register_upload(conn, sha256, original_filename, stored_path, size, stored_size,
+                                       resync=mode == 'sync')
+            if existing:
+                duplicates.append({
+                    'file': original_filename,
+                    'duplicate_of': existing['original_name'],
+                    'status': existing['status'],
+                    'rows': existing['row_count'],
+                    'sha256': sha256
+                })
+            else:
+                saved.append((stored_path, original_filename))
     conn.close()
     
+    if not saved:
+        return jsonify({'success': True, 'job_id': None, 'duplicates': duplicates})
+    
+    # Parsing and inserting happen in a background job; poll /api/jobs/<id>.
+    job_id = job_queue.enqueue(saved, **options)
     return jsonify({
         'success': True,
-        'added': added_count,
-        'stats': get_stats()
-    })
+        'job_id': job_id,
+        'status_url': url_for('get_job', job_id=job_id),
+        'duplicates': duplicates
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Progress of a background upload job"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in ('done', 'failed'):
+        job['stats'] = get_stats()
+    return jsonify(job)
 
 @app.route('/api/files/list')
 def list_uploaded_files():
@@ -457,7 +536,23 @@ def list_uploaded_files():
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        files = []
+        conn = get_db_connection()
+        files = [
+            {
+                'id': upload['sha256'],
+                'name': upload['original_name'],
+                'size': upload['size'],
+                'stored_size': upload['stored_size'],
+                'rows': upload['row_count'],
+                'status': upload['status'],
+                'duplicates': upload['duplicate_count'],
+                'modified': upload['uploaded_at']
+            }
+            for upload in list_uploads(conn)
+        ]
+        conn.close()
+        
+        # Files saved before the content-addressed store
         upload_folder = app.config['UPLOAD_FOLDER']
         if os.path.exists(upload_folder):
             for filename in os.listdir(upload_folder):
@@ -475,6 +570,8 @@ def list_uploaded_files():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+DELETE_FILE_ROWS_SQL = hot_query('delete_uploaded_file', 'DELETE FROM clients WHERE source_file = ?', ('x',))
+
 @app.route('/api/files/delete', methods=['POST'])
 def delete_uploaded_file():
     if 'role' not in session or session['role'] != 'admin':
@@ -483,6 +580,19 @@ def delete_uploaded_file():
     data = request.get_json()
     filename = data.get('filename')
     
+    if data.get('id'):
+        conn = get_db_connection()
+        try:
+            deleted = delete_upload(conn, data['id'])
+        except UploadConflict as e:
+            return jsonify({'error': str(e)}), 409
+        finally:
+            conn.close()
+        if deleted is None:
+            return jsonify({'error': 'File not found'}), 404
+        query_cache.invalidate('clients')
+        return jsonify({'success': True, 'message': f'File and data deleted'})
+    
     try:
         if '..' in filename or filename.startswith('/'):
             return jsonify({'error': 'Invalid filename'}), 400
@@ -499,8 +609,9 @@ def delete_uploaded_file():
         # 1. Delete associated data from DB
         conn = get_db_connection()
         try:
-            conn.execute("DELETE FROM clients WHERE source_file = ?", (filename,))
+            conn.execute(DELETE_FILE_ROWS_SQL, (filename,))
             conn.commit()
+            query_cache.invalidate('clients')
         except Exception as db_e:
             print(f"Error deleting from DB: {db_e}")
             # Continue to delete file even if DB fail (or maybe not? prioritize cleanup)
@@ -525,7 +636,7 @@ def add_client():
     
     business_name = data.get('business_name')
     location = normalize_city(data.get('location', ''))
-    phone = data.get('phone', 'אין')
+    phone = format_phone_number(data.get('phone', 'אין'))
     anydesk = data.get('anydesk', 'אין')
     
     # Store data as extra_data json as well
@@ -536,6 +647,7 @@ def add_client():
                  (business_name, location, phone, anydesk, 'Manual Entry', extra))
     conn.commit()
     conn.close()
+    query_cache.invalidate('clients')
     
     return jsonify({'success': True})
 
@@ -550,7 +662,7 @@ def update_client(client_id):
     
     business_name = data.get('business_name')
     location = normalize_city(data.get('location', ''))
-    phone = data.get('phone', 'אין')
+    phone = format_phone_number(data.get('phone', 'אין'))
     anydesk = data.get('anydesk', 'אין')
     
     # Update the core fields
@@ -576,6 +688,7 @@ def update_client(client_id):
             WHERE id = ?
         ''', (business_name, location, phone, anydesk, extra_json, client_id))
         conn.commit()
+        query_cache.invalidate('clients')
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -597,6 +710,7 @@ def delete_client(client_id):
         # Delete the client
         conn.execute("DELETE FROM clients WHERE id = ?", (client_id,))
         conn.commit()
+        query_cache.invalidate('clients')
         
         return jsonify({'success': True, 'message': 'Client deleted successfully'})
     except Exception as e:
@@ -605,67 +719,15 @@ def delete_client(client_id):
         conn.close()
 
 @app.route('/api/clients/details/<int:client_id>')
+@depends_on('clients')
 def get_client_details(client_id):
+    """Merged view of every record of the clicked client's business (utils/profiles.py)"""
     conn = get_db_connection()
     try:
-        # Fetch the clicked client first to identify the business
-        targ_client = conn.execute("SELECT * FROM clients WHERE id = ?", (client_id,)).fetchone()
-        if not targ_client:
+        profile = client_profile(conn, client_id)
+        if profile is None:
             return jsonify({'error': 'Client not found'}), 404
-        
-        business_name = targ_client['business_name']
-        
-        # Now fetch ALL records for this business name to aggregate data
-        # Using case-insensitive match just in case
-        all_records = conn.execute("SELECT * FROM clients WHERE business_name = ? COLLATE NOCASE", (business_name,)).fetchall()
-        
-        merged_data = {}
-        source_files = set()
-        
-        # Iterate over all related records and merge data
-        for record in all_records:
-            # 1. Start with core fields from this record (in case extra_data is partial)
-            # 2. Parse extra_data
-            row_data = {}
-            if record['extra_data']:
-                try:
-                    row_data = json.loads(record['extra_data'])
-                except:
-                    pass
-            
-            # 3. Always merge core fields from the record as fallback/primary if not in extra_data
-            for field in ['location', 'phone', 'anydesk', 'business_name']:
-                 val = record[field]
-                 if val and val != 'אין' and field not in row_data:
-                      row_data[field] = val
-
-            # 4. Merge into main dict
-            merged_data.update(row_data)
-            
-            # 5. Collect source file
-            if record['source_file']:
-                source_files.add(record['source_file'])
-        
-        # Ensure business_name is consistently set
-        merged_data['business_name'] = business_name
-        
-        # Consolidate source files
-        if source_files:
-            merged_data['source_file'] = ', '.join(sorted(list(source_files)))
-        
-        # Use Pandas for display formatting
-        df = pd.DataFrame([merged_data])
-        
-        # Transpose
-        df_transposed = df.transpose().reset_index()
-        df_transposed.columns = ['Field', 'Value']
-        
-        df_transposed = df_transposed.fillna('')
-        
-        result = df_transposed.to_dict('records')
-        
-        return jsonify(result)
-        
+        return Response(profile, mimetype='application/json')
     except Exception as e:
         print(f"Error in details: {e}")
         return jsonify({'error': str(e)}), 500
@@ -673,122 +735,495 @@ def get_client_details(client_id):
         conn.close()
 
 
+@query_cache.cached('clients')
+def search_page(query, fields, limit, offset, location=None):
+    """One page of search results as dicts, plus whether there are more"""
+    conn = get_db_connection()
+    clients, has_more = search_clients(conn, query, fields, limit=limit, offset=offset, location=location)
+    conn.close()
+    return [dict(row) for row in clients], has_more
+
 @app.route('/api/search')
+@depends_on('clients')
 def search():
+    """Ranked full-text search over clients (name, city, phone, AnyDesk and all Excel columns)"""
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
     
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid page or limit'}), 400
+    # Optional column filter, e.g. fields=business_name,phone
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    # Optional city, e.g. location=חיפה (the dashboard's in-city search)
+    location = request.args.get('location', '').strip() or None
+    
+    clients, has_more = search_page(query, fields, per_page, (page - 1) * per_page, location)
+    
+    response = jsonify(clients)
+    response.headers['X-Page'] = str(page)
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    return response
+
+LOCATION_COLUMNS = ('id', 'business_name', 'location', 'phone', 'anydesk', 'source_file')
+# Stored keys location_client() never copies from extra_data
+LOCATION_SKIPPED_KEYS = ('id', 'created_at', 'extra_data')
+# A city's client as JSON text with its Excel columns spliced in, no parsing;
+# a stored key wins over the column of the same name (utils/client_json.py)
+LOCATION_CLIENT_SQL = client_sql(
+    LOCATION_COLUMNS,
+    overrides=[column for column in LOCATION_COLUMNS if column not in LOCATION_SKIPPED_KEYS],
+    dropped=LOCATION_SKIPPED_KEYS
+)
+
+LOCATION_CLIENTS_SQL = hot_query('clients_by_location',
+                                 f"SELECT {LOCATION_CLIENT_SQL} FROM clients WHERE location = ? ORDER BY id", ('x',))
+
+def location_client(row):
+    """Client dict with all its Excel columns merged in"""
+    client = {}
+    # Start with base fields
+    for key in LOCATION_COLUMNS:
+        client[key] = row[key]
+    
+    # Merge ALL extra_data fields
+    if row['extra_data']:
+        try:
+            extra = json.loads(row['extra_data'])
+            if isinstance(extra, dict):
+                for key, value in extra.items():
+                    if key not in LOCATION_SKIPPED_KEYS:
+                        client[key] = value
+        except Exception as e:
+            print(f"Error parsing extra_data: {e}")
+    return client
+
+def location_client_json(row):
+    """JSON text of a row selected with LOCATION_CLIENT_SQL"""
+    client = splice_members(row)
+    return client if client is not None else dumps_bytes(location_client(unspliced(row)))
+
+def iter_location_clients(conn, location):
+    """JSON text of every client in a city"""
+    cursor = conn.execute(LOCATION_CLIENTS_SQL, (location,))
+    try:
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH)
+            if not rows:
+                break
+            for row in rows:
+                yield location_client_json(row)
+    finally:
+        cursor.close()
+
+@query_cache.cached('clients')
+def clients_at_location(location):
+    """Every client in a city with all its Excel columns merged in, as a JSON body"""
     conn = get_db_connection()
-    # Safe SQL search
-    clients = conn.execute("SELECT * FROM clients WHERE business_name LIKE ? LIMIT 20", ('%' + query + '%',)).fetchall()
+    body = b''.join(iter_json_array(iter_location_clients(conn, location), encoded=True))
     conn.close()
+    return body
+
+# Large lists can be streamed instead of built in memory: ?stream=ndjson sends
+# one JSON object per line, ?stream=json the usual JSON body in chunks.
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def stream_format():
+    fmt = request.args.get('stream', '').lower()
+    return fmt if fmt in ('ndjson', 'json') else None
+
+def streamed(body, conn, cursor=None):
+    """Response body for a generator reading through conn: it runs inside
+    the request context and closes cursor and conn once it is exhausted or
+    the client goes away"""
+    def generate():
+        try:
+            yield from body
+        finally:
+            if cursor is not None:
+                cursor.close()
+            conn.close()
+    return stream_with_context(generate())
+
+# Paged reads of one city (?limit= / ?cursor=). Every sort walks an index in
+# order from the cursor - idx_clients_location (location, rowid) for id,
+# idx_clients_location_name (migration 13) for business_name with id breaking
+# ties - so page 500 costs the same as page 1.
+LOCATION_PAGE_SIZE = 100
+LOCATION_PAGE_MAX = 1000
+NAME_KEY = "ifnull(business_name, '') COLLATE NOCASE"
+LOCATION_SORTS = {
+    'id': ('id', False),
+    '-id': ('id', True),
+    'business_name': (NAME_KEY, False),
+    '-business_name': (NAME_KEY, True),
+}
+
+def project_client(row, fields):
+    """Just the requested fields of a client, merged as location_client()
+    merges them: a stored Excel column wins over the base column of the same
+    name, whichever other fields were asked for"""
+    extra = {}
+    if 'extra_data' in row.keys() and row['extra_data']:
+        try:
+            extra = json.loads(row['extra_data'])
+        except ValueError as e:
+            print(f"Error parsing extra_data for client {row['id']}: {e}")
+        if not isinstance(extra, dict):
+            extra = {}
+    client = {}
+    for field in fields:
+        if field in extra and field not in LOCATION_SKIPPED_KEYS:
+            client[field] = extra[field]
+        elif field in LOCATION_COLUMNS:
+            client[field] = row[field]
+    return client
+
+def location_page_query(columns, location, sort, after_id, after_name, limit):
+    """(sql, params) reading limit + 1 clients of a city after the cursor"""
+    key, descending = LOCATION_SORTS[sort]
+    op, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    where, params = ["location = ?"], [location]
+    if after_id is not None:
+        if key == 'id':
+            where.append(f"id {op} ?")
+            params.append(after_id)
+        else:
+            # Spelled out rather than as a row value so SQLite seeks the index
+            where.append(f"{NAME_KEY} {op}= ? AND ({NAME_KEY} {op} ? OR id {op} ?)")
+            params += [after_name, after_name, after_id]
+    order = f"id {direction}" if key == 'id' else f"{NAME_KEY} {direction}, id {direction}"
+    params.append(limit + 1)
+    return f"SELECT {columns} FROM clients WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?", params
+
+LOCATION_PAGE_COLUMNS = f"id, business_name, {LOCATION_CLIENT_SQL}"
+for _sort in LOCATION_SORTS:
+    hot_query(f'clients_by_location_page_{_sort}',
+              *location_page_query(LOCATION_PAGE_COLUMNS, 'x', _sort, 1, 'a', LOCATION_PAGE_SIZE))
+
+@query_cache.cached('clients')
+def location_page(location, sort, after_id, after_name, limit, fields):
+    """One page of a city's clients (as JSON text), the city's total and the
+    next cursor (or None)"""
+    if fields is None:
+        columns = LOCATION_PAGE_COLUMNS
+    else:
+        # extra_data is only read (and parsed) when a wanted field can come
+        # from it, which is any field but id
+        with_extra = any(field not in LOCATION_SKIPPED_KEYS for field in fields)
+        columns = ', '.join(LOCATION_COLUMNS + (('extra_data',) if with_extra else ()))
+    query, params = location_page_query(columns, location, sort, after_id, after_name, limit)
+    
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(query, params).fetchall()
+        total = count_clients(conn, location)
+    finally:
+        conn.close()
     
-    return jsonify([dict(row) for row in clients])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        position = {'sort': sort, 'after_id': last['id']}
+        if LOCATION_SORTS[sort][0] != 'id':
+            position['after_name'] = last['business_name'] or ''
+        next_cursor = encode_cursor(**position)
+    if fields is None:
+        clients = [location_client_json(row) for row in rows]
+    else:
+        clients = [dumps_bytes(project_client(row, fields)) for row in rows]
+    return clients, total, next_cursor
 
 @app.route('/api/clients')
+@depends_on('clients')
 def get_clients_by_location():
+    """Clients in one city.
+
+    Without limit/cursor this is the whole city, every client with all its
+    Excel columns merged in (optionally streamed, see stream_format). With
+    them it is one page, {data, next_cursor, limit, sort, total}: sort is id
+    or business_name, '-' first for descending, and fields=a,b keeps only
+    those keys, base or Excel columns alike.
+    """
     location = request.args.get('location', '').strip()
-    conn = get_db_connection()
     if not location:
-        clients = []
-    else:
-        rows = conn.execute("SELECT * FROM clients WHERE location = ?", (location,)).fetchall()
-        clients = []
-        for row in rows:
-            client = {}
-            # Start with base fields
-            for key in row.keys():
-                if key not in ['extra_data', 'created_at']:
-                    client[key] = row[key]
-            
-            # Merge ALL extra_data fields
-            if row['extra_data']:
-                try:
-                    extra = json.loads(row['extra_data'])
-                    if isinstance(extra, dict):
-                        for key, value in extra.items():
-                            if key not in ['id', 'created_at', 'extra_data']:
-                                client[key] = value
-                except Exception as e:
-                    print(f"Error parsing extra_data: {e}")
-            
-            clients.append(client)
+        return jsonify([])
+    if 'limit' in request.args or 'cursor' in request.args:
+        return location_page_response(location)
+    fmt = stream_format()
+    if fmt == 'ndjson':
+        conn = get_db_connection()
+        return Response(streamed(iter_ndjson(iter_location_clients(conn, location), encoded=True), conn),
+                        mimetype=NDJSON_MIMETYPE)
+    if fmt == 'json':
+        conn = get_db_connection()
+        return Response(streamed(iter_json_array(iter_location_clients(conn, location), encoded=True), conn),
+                        mimetype='application/json')
+    return Response(clients_at_location(location), mimetype='application/json')
+
+def location_page_response(location):
+    try:
+        limit = min(max(int(request.args.get('limit', LOCATION_PAGE_SIZE)), 1), LOCATION_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    try:
+        position = decode_cursor(request.args['cursor']) if request.args.get('cursor') else {}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    sort = request.args.get('sort') or position.get('sort') or 'id'
+    if sort not in LOCATION_SORTS:
+        return jsonify({'error': f"Invalid sort, expected one of: {', '.join(LOCATION_SORTS)}"}), 400
+    if position and (position.get('sort') != sort or 'after_id' not in position):
+        return jsonify({'error': 'Cursor does not match sort'}), 400
+    fields = tuple(dict.fromkeys(f.strip() for f in request.args.get('fields', '').split(',') if f.strip())) or None
     
-    conn.close()
+    clients, total, next_cursor = location_page(
+        location, sort, position.get('after_id'), position.get('after_name', ''), limit, fields
+    )
+    tail = {'limit': limit, 'next_cursor': next_cursor, 'sort': sort, 'total': total}
+    body = b''.join(iter_json_envelope({}, 'data', clients, tail=lambda: tail, encoded=True))
+    return Response(body, mimetype='application/json')
+
+def encode_cursor(**position):
+    """Opaque page token for keyset pagination, e.g. encode_cursor(after_id=42)"""
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw)
+        cursor = {key: int(position[key]) for key in ('after_id', 'before_id') if key in position}
+        cursor.update((key, str(position[key])) for key in ('sort', 'after_name') if key in position)
+        return cursor
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def count_clients(conn, location=None, source_file=None):
+    """Row count for the given filters, from the rollups where possible"""
+    if location and not source_file:
+        row = conn.execute("SELECT count FROM location_stats WHERE location = ?", (location,)).fetchone()
+        return row[0] if row else 0
+    if not location and not source_file:
+        return conn.execute("SELECT total FROM client_counters WHERE id = 1").fetchone()[0]
+    where, params = [], []
+    if location:
+        where.append("location = ?")
+        params.append(location)
+    if source_file:
+        where.append("source_file = ?")
+        params.append(source_file)
+    return conn.execute("SELECT COUNT(*) FROM clients WHERE " + " AND ".join(where), params).fetchone()[0]
+
+def page_rows(cursor, per_page, before_id, state):
+    """Rows of one page from a query that asked for per_page + 1 rows.
+
+    Sets state['has_more'] and the page's first_id/last_id as it goes.
+    Going backwards reads ascending from the cursor, so that page is read
+    whole and flipped; otherwise rows are yielded as they are fetched.
+    """
+    if before_id is not None:
+        rows = cursor.fetchall()
+        state['has_more'] = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        batches = [rows]
+    else:
+        batches = iter(lambda: cursor.fetchmany(STREAM_BATCH), [])
+    seen = 0
+    for batch in batches:
+        for row in batch:
+            if seen == per_page:
+                state['has_more'] = True
+                return
+            state.setdefault('first_id', row['id'])
+            state['last_id'] = row['id']
+            seen += 1
+            yield row
+    state.setdefault('has_more', False)
+
+# Client columns served by the API; row_key, row_hash and upload_sha256 are
+# bookkeeping for imports and are never selected for a response
+PAGE_COLUMNS = ('id', 'business_name', 'location', 'phone', 'anydesk', 'source_file', 'created_at')
+CLIENTS_PAGE_SIZE = 100
+CLIENTS_PAGE_MAX = 1000  # the admin full view asks for 1000
+# Compact-view client as JSON text with the stored extra_data spliced in
+PAGE_CLIENT_SQL = client_sql(PAGE_COLUMNS)
+
+def page_client_json(row):
+    """JSON text of a row selected with PAGE_CLIENT_SQL"""
+    client = splice_nested(row, 'extra_data')
+    return client if client is not None else dumps_bytes(page_client(unspliced(row), False, set()))
+
+def page_client(row, expanded_view, all_fields):
+    client = {
+        'id': row['id'],
+        'business_name': row['business_name'],
+        'location': row['location'],
+        'phone': row['phone'],
+        'anydesk': row['anydesk'],
+        'source_file': row['source_file'],
+        'created_at': row['created_at']
+    }
     
-    return jsonify(clients)
+    # Parse extra_data which contains ALL Excel columns
+    if row['extra_data']:
+        try:
+            extra = json.loads(row['extra_data'])
+            if isinstance(extra, dict):
+                if expanded_view:
+                    # In expanded view, add ALL fields as top-level properties
+                    for key, value in extra.items():
+                        client[key] = value
+                        all_fields.add(key)
+                else:
+                    # In compact view, keep extra_data as separate object
+                    client['extra_data'] = extra
+        except Exception as e:
+            print(f"Error parsing extra_data for client {row['id']}: {e}")
+            client['extra_data'] = {}
+    return client
+
+def clients_page_query(expanded, location, source_file, after_id, before_id, per_page, offset):
+    """(sql, params) reading per_page + 1 clients, newest first, for get_all_clients"""
+    where, params = [], []
+    if location:
+        where.append("location = ?")
+        params.append(location)
+    if source_file:
+        where.append("source_file = ?")
+        params.append(source_file)
+    if after_id is not None:
+        where.append("id < ?")
+        params.append(after_id)
+    elif before_id is not None:
+        where.append("id > ?")
+        params.append(before_id)
+    # The expanded view collects every Excel column name, so it parses rows in
+    # Python; the compact view splices the stored JSON as is
+    if expanded:
+        query = f"SELECT {', '.join(PAGE_COLUMNS)}, extra_data FROM clients"
+    else:
+        query = f"SELECT id, {PAGE_CLIENT_SQL} FROM clients"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    # Going backwards reads ascending from the cursor and flips the page afterwards
+    query += " ORDER BY id ASC" if before_id is not None else " ORDER BY id DESC"
+    query += " LIMIT ?"
+    params.append(per_page + 1)
+    if after_id is None and before_id is None and offset:
+        query += " OFFSET ?"
+        params.append(offset)
+    return query, params
+
+# The unfiltered pages walk the rowid b-tree from one end and stop at LIMIT
+hot_query('clients_page', *clients_page_query(False, '', '', None, None, CLIENTS_PAGE_SIZE, 0), scan_ok=True)
+hot_query('clients_page_offset', *clients_page_query(False, '', '', None, None, CLIENTS_PAGE_SIZE, 500), scan_ok=True)
+hot_query('clients_page_after', *clients_page_query(False, '', '', 1000, None, CLIENTS_PAGE_SIZE, 0))
+hot_query('clients_page_before', *clients_page_query(False, '', '', None, 1000, CLIENTS_PAGE_SIZE, 0))
+hot_query('clients_page_by_location', *clients_page_query(False, 'x', '', 1000, None, CLIENTS_PAGE_SIZE, 0))
 
 @app.route('/api/clients/all')
+@depends_on('clients')
 def get_all_clients():
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('limit', 100))
+    """Page through clients, newest first.
+
+    Either classic page/limit (OFFSET) or keyset paging with cursor (or
+    after_id/before_id), which costs the same on page 1 and page 10,000.
+    Optional filters: location, source_file. total=false skips the count.
+    """
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('limit', CLIENTS_PAGE_SIZE)), 1), CLIENTS_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'Invalid page or limit'}), 400
     offset = (page - 1) * per_page
+    location = request.args.get('location', '').strip()
+    source_file = request.args.get('source_file', '').strip()
+    with_total = request.args.get('total', 'true').lower() != 'false'
+    
+    try:
+        position = decode_cursor(request.args['cursor']) if request.args.get('cursor') else {}
+        for key in ('after_id', 'before_id'):
+            if request.args.get(key):
+                position[key] = int(request.args[key])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    after_id = position.get('after_id')
+    before_id = position.get('before_id')
     
     # Check if admin wants to see all columns (expanded view)
     expanded_view = request.args.get('expanded', 'false').lower() == 'true'
     
+    query, params = clients_page_query(expanded_view, location, source_file, after_id, before_id, per_page, offset)
+    
     conn = get_db_connection()
+    stream = None
     try:
-        total = conn.execute("SELECT COUNT(*) FROM clients").fetchone()[0]
-        rows = conn.execute("SELECT * FROM clients ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, offset)).fetchall()
-        
-        results = []
-        all_fields = set()  # To collect all unique field names
-        
-        for row in rows:
-            client = {
-                'id': row['id'],
-                'business_name': row['business_name'],
-                'location': row['location'],
-                'phone': row['phone'],
-                'anydesk': row['anydesk'],
-                'source_file': row['source_file'],
-                'created_at': row['created_at']
+        total = count_clients(conn, location, source_file) if with_total else None
+        cursor = conn.execute(query, params)
+        state = {'all_fields': set()}
+        rows = page_rows(cursor, per_page, before_id, state)
+        if expanded_view:
+            clients = (page_client(row, True, state['all_fields']) for row in rows)
+        else:
+            clients = (page_client_json(row) for row in rows)
+        encoded = not expanded_view
+        head = {'total': total, 'page': page, 'per_page': per_page}
+        
+        def links():
+            # Newer rows exist before this page unless it started at the top;
+            # older rows exist after it if we over-fetched (or came from there).
+            has_more = state['has_more']
+            has_newer = offset > 0 or after_id is not None or (before_id is not None and has_more)
+            has_older = has_more if before_id is None else True
+            first_id, last_id = state.get('first_id'), state.get('last_id')
+            result = {
+                'next_cursor': encode_cursor(after_id=last_id) if last_id is not None and has_older else None,
+                'prev_cursor': encode_cursor(before_id=first_id) if first_id is not None and has_newer else None
             }
-            
-            # Parse extra_data which contains ALL Excel columns
-            if row['extra_data']:
-                try:
-                    extra = json.loads(row['extra_data'])
-                    if isinstance(extra, dict):
-                        if expanded_view:
-                            # In expanded view, add ALL fields as top-level properties
-                            for key, value in extra.items():
-                                client[key] = value
-                                all_fields.add(key)
-                        else:
-                            # In compact view, keep extra_data as separate object
-                            client['extra_data'] = extra
-                except Exception as e:
-                    print(f"Error parsing extra_data for client {row['id']}: {e}")
-                    client['extra_data'] = {}
-            
-            results.append(client)
-            
-        response = {
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'data': results
-        }
+            # If expanded view, also return all unique fields for table headers
+            if expanded_view:
+                result['all_fields'] = sorted(list(state['all_fields']))
+            return result
         
-        # If expanded view, also return all unique fields for table headers
-        if expanded_view:
-            response['all_fields'] = sorted(list(all_fields))
-            
+        fmt = stream_format()
+        if fmt == 'ndjson':
+            # Page details follow the rows, as a last line {"_page": {...}}
+            stream = streamed(iter_ndjson(clients, trailer=lambda: {'_page': {**head, **links()}}, encoded=encoded),
+                              conn, cursor)
+            return Response(stream, mimetype=NDJSON_MIMETYPE)
+        if fmt == 'json':
+            stream = streamed(iter_json_envelope(head, 'data', clients, tail=links, encoded=encoded), conn, cursor)
+            return Response(stream, mimetype='application/json')
+        if encoded:
+            body = b''.join(iter_json_envelope(head, 'data', clients, tail=links, encoded=True))
+            return Response(body, mimetype='application/json')
+        
+        response = dict(head, data=list(clients))
+        response.update(links())
         return jsonify(response)
     finally:
-        conn.close()
+        # A streamed body closes conn itself once it has been sent
+        if stream is None:
+            conn.close()
 
+TOP_LOCATIONS_SQL = hot_query('stats_top_locations',
+                              'SELECT location, count FROM location_stats ORDER BY count DESC LIMIT 10')
+
+@query_cache.cached('clients')
 def get_stats():
+    """Analytics summary, read from the rollups kept by triggers (utils/rollups.py)"""
     conn = get_db_connection()
     try:
-        total = conn.execute("SELECT COUNT(*) FROM clients").fetchone()[0]
-        unique_locs = conn.execute("SELECT COUNT(DISTINCT location) FROM clients").fetchone()[0]
+        total, unique_locs = conn.execute(STATS_SQL).fetchone()
         
         # Top 10 locations
-        top_locs = conn.execute("SELECT location, COUNT(*) as count FROM clients GROUP BY location ORDER BY count DESC LIMIT 10").fetchall()
+        top_locs = conn.execute(TOP_LOCATIONS_SQL).fetchall()
     except:
         return {'total': 0, 'unique_locations': 0, 'top_location': 'N/A', 'locations': []}
     finally:
@@ -811,10 +1246,75 @@ def get_stats():
     }
 
 @app.route('/api/analytics')
+@depends_on('clients')
 def analytics():
     return jsonify(get_stats())
 
+@app.route('/api/db/stats')
+def db_stats():
+    """Connection pool statistics for this worker"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(db_pool.stats())
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Query cache hit/miss counters and memory use for this worker"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(query_cache.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format, summed over every worker (admin session or bearer token)"""
+    token = app.config['METRICS_TOKEN']
+    if not (token and request.headers.get('Authorization') == f'Bearer {token}'):
+        if 'role' not in session or session['role'] != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles')
+def stored_profiles():
+    """Stored request profiles, newest first"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    profiles = list_profiles(app.config['PROFILE_DIR'])
+    for profile in profiles:
+        profile['url'] = url_for('download_profile', name=profile['name'])
+    return jsonify(profiles)
+
+@app.route('/api/admin/profiles/<name>')
+def download_profile(name):
+    """Collapsed stacks of one profile (open in speedscope or flamegraph.pl)"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    path = profile_path(app.config['PROFILE_DIR'], name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(os.path.abspath(path), mimetype='text/plain', as_attachment=True, download_name=f'{name}.collapsed')
+
+@app.route('/api/admin/slow-queries')
+def slow_query_report():
+    """Worst statements from the slow-query log, grouped by normalized SQL"""
+    if 'role' not in session or session['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'count'):
+        return jsonify({'error': 'sort must be total_ms, max_ms or count'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    return jsonify({
+        'threshold_ms': app.config['SLOW_QUERY_MS'],
+        'queries': slow_queries.top(limit, sort),
+    })
+
+CLIENT_BY_ID_SQL = hot_query('client_by_id', f"SELECT {', '.join(PAGE_COLUMNS)}, extra_data FROM clients WHERE id = ?",
+                             (1,))
+
 @app.route('/api/clients/full/<int:client_id>')
+@depends_on('clients')
 def get_client_full_details(client_id):
     """Get complete client data with ALL Excel columns"""
     if 'role' not in session or session['role'] != 'admin':
@@ -822,7 +1322,7 @@ def get_client_full_details(client_id):
     
     conn = get_db_connection()
     try:
-        client = conn.execute("SELECT * FROM clients WHERE id = ?", (client_id,)).fetchone()
+        client = conn.execute(CLIENT_BY_ID_SQL, (client_id,)).fetchone()
         if not client:
             return jsonify({'error': 'Client not found'}), 404
             
@@ -863,14 +1363,24 @@ def get_client_full_details(client_id):
         conn.close()
 
 @app.route('/api/clients/fields')
+@depends_on('clients')
 def get_all_fields():
     """Get all unique field names from all clients' extra_data"""
     if 'role' not in session or session['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
     
+    return jsonify(all_fields())
+
+# Every client's extra_data: the answer covers the whole table
+EXTRA_DATA_SQL = hot_query('clients_fields', "SELECT extra_data FROM clients WHERE extra_data IS NOT NULL AND extra_data != ''",
+                           scan_ok=True)
+
+@query_cache.cached('clients')
+def all_fields():
+    """Base column names plus every key found in any client's extra_data"""
     conn = get_db_connection()
     try:
-        clients = conn.execute("SELECT extra_data FROM clients WHERE extra_data IS NOT NULL AND extra_data != ''").fetchall()
+        clients = conn.execute(EXTRA_DATA_SQL).fetchall()
         
         all_fields = set(['business_name', 'location', 'phone', 'anydesk', 'source_file'])
         
@@ -882,10 +1392,10 @@ def get_all_fields():
             except:
                 continue
         
-        return jsonify({
+        return {
             'fields': sorted(list(all_fields)),
             'count': len(all_fields)
-        })
+        }
     finally:
         conn.close()
 
@@ -901,70 +1411,24 @@ def export_clients():
         return jsonify({'error': 'Unauthorized'}), 403
     
     export_format = request.args.get('format', 'excel')
-    selected_columns = request.args.get('columns', '').split(',')
+    selected_columns = [col for col in request.args.get('columns', '').split(',') if col]
     location_filter = request.args.get('location', '')
     
     conn = get_db_connection()
-    
-    # Build query
-    query = "SELECT * FROM clients"
-    params = []
-    if location_filter:
-        query += " WHERE location = ?"
-        params.append(location_filter)
-    query += " ORDER BY id DESC"
-    
-    rows = conn.execute(query, params).fetchall()
-    
-    # Prepare data
-    data = []
-    for row in rows:
-        client = {}
-        # Always include base columns
-        client['id'] = row['id']
-        client['business_name'] = row['business_name']
-        client['location'] = row['location']
-        client['phone'] = row['phone']
-        client['anydesk'] = row['anydesk']
-        client['source_file'] = row['source_file']
-        client['created_at'] = row['created_at']
-        
-        # Add extra_data fields
-        if row['extra_data']:
-            try:
-                extra = json.loads(row['extra_data'])
-                if isinstance(extra, dict):
-                    for key, value in extra.items():
-                        client[key] = value
-            except:
-                pass
-        
-        data.append(client)
-    
-    conn.close()
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Filter columns if specified
-    if selected_columns and selected_columns[0]:
-        available_columns = [col for col in selected_columns if col in df.columns]
-        df = df[available_columns]
+    columns = resolve_columns(conn, selected_columns, location_filter)
+    rows = iter_export_rows(conn, columns, location_filter)
     
     # Export based on format
     if export_format == 'csv':
-        csv_data = df.to_csv(index=False, encoding='utf-8-sig')
         return Response(
-            csv_data,
+            stream_csv(columns, rows),
             mimetype="text/csv",
             headers={"Content-disposition": "attachment; filename=clients_export.csv"}
         )
     else:
-        # Excel export
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Clients')
-        
+        # Excel export: write-only workbook spooled to a temp file, streamed from disk
+        output = tempfile.TemporaryFile()
+        write_xlsx(columns, rows, output)
         output.seek(0)
         return send_file(
             output,
@@ -972,6 +1436,7 @@ def export_clients():
             as_attachment=True,
             download_name='clients_export.xlsx'
         )
+
 @app.route('/api/contact', methods=['GET', 'POST'])
 def handle_contact():
     conn = get_db_connection()
@@ -1008,4 +1473,7 @@ def delete_contact_message(message_id):
         conn.close()
 
 if __name__ == '__main__':
+    # The debug reloader re-runs this file in a child that does the serving
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.start()
     app.run(host='0.0.0.0', debug=True, port=5001)
@@ -0,0 +1,121 @@
+"""CPU cost of client JSON spliced from stored text vs. merged in Python.
+
+    python benchmarks/bench_extra_json.py --rows 10000
+
+Imports --rows generated clients into one city with ingest_file (every cell
+stored as a string in extra_data, base columns included under their own
+names) and measures CPU time per 10k rows for:
+
+  location  /api/clients?location= rows, Excel columns merged flat
+  page      /api/clients/all rows, extra_data nested as an object
+
+each built the old way (json.loads every extra_data, merge into a dict, encode
+the dict) and the current one (JSON1 writes the base columns and vets the
+stored text, whose members are spliced in as bytes; utils/client_json.py),
+plus the whole /api/clients?location= request through the Flask test client.
+Both ways are checked to produce the same JSON.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CITY = 'חיפה'
+
+
+def load_clients(conn, path, rows, seed=1):
+    """Import --rows generated clients, all in one city, through ingest_file
+    (so extra_data holds the renamed base columns too, as in production)"""
+    from utils.generate_mock_data import header_row, generate_rows, write_csv
+    from utils.ingest import ingest_file
+
+    rng = random.Random(seed)
+    labels, fields = header_row(rng)
+    city = fields.index('location')
+    sheet = ([*values[:city], CITY, *values[city + 1:]] for values in generate_rows(rows, fields, rng))
+    write_csv(path, labels, sheet)
+    ingest_file(conn, path, os.path.basename(path))
+
+
+def cpu_ms(func, repeat):
+    """Median CPU ms of func() and its last result"""
+    times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        result = func()
+        times.append(time.process_time() - started)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['NEXTIS_AUTO_MIGRATE'] = '1'
+    os.chdir(tempfile.mkdtemp())
+    import app as nextis
+    from utils.client_json import MERGE
+    from utils.fastjson import iter_json_array
+
+    conn = nextis.get_db_connection()
+    load_clients(conn, os.path.abspath('bench.csv'), args.rows)
+    nextis.query_cache.max_entries = 0  # rebuild the list on every request
+    per_10k = 10000 / args.rows
+
+    def python_location():
+        cursor = conn.execute(
+            'SELECT id, business_name, location, phone, anydesk, source_file, extra_data '
+            'FROM clients WHERE location = ? ORDER BY id', (CITY,)
+        )
+        return b''.join(iter_json_array(nextis.location_client(row) for row in cursor))
+
+    def sqlite_location():
+        return b''.join(iter_json_array(nextis.iter_location_clients(conn, CITY), encoded=True))
+
+    def python_page():
+        cursor = conn.execute('SELECT * FROM clients ORDER BY id DESC')
+        return b''.join(iter_json_array(nextis.page_client(row, False, set()) for row in cursor))
+
+    def sqlite_page():
+        cursor = conn.execute(f'SELECT id, {nextis.PAGE_CLIENT_SQL} FROM clients ORDER BY id DESC')
+        return b''.join(iter_json_array((nextis.page_client_json(row) for row in cursor), encoded=True))
+
+    # Rows the SQLite way still hands to Python (invalid stored JSON)
+    fallback = conn.execute(
+        f'SELECT COUNT(*) FROM (SELECT {nextis.LOCATION_CLIENT_SQL} FROM clients WHERE location = ?) '
+        f'WHERE extra_state = {MERGE}', (CITY,)
+    ).fetchone()[0]
+    results = {'rows': args.rows, 'python_fallback_rows': fallback}
+    for name, python_way, sqlite_way in (('location', python_location, sqlite_location),
+                                         ('page', python_page, sqlite_page)):
+        python_ms, expected = cpu_ms(python_way, args.repeat)
+        sqlite_ms, body = cpu_ms(sqlite_way, args.repeat)
+        # Pairs, not dicts: the merge must keep dict.update()'s key order too
+        if json.loads(body, object_pairs_hook=list) != json.loads(expected, object_pairs_hook=list):
+            sys.exit(f'{name}: SQLite output differs from the Python merge')
+        results[name] = {
+            'python_cpu_ms_per_10k': round(python_ms * per_10k, 1),
+            'sqlite_cpu_ms_per_10k': round(sqlite_ms * per_10k, 1),
+            'saved_cpu_ms_per_10k': round((python_ms - sqlite_ms) * per_10k, 1),
+            'speedup': round(python_ms / sqlite_ms, 2) if sqlite_ms else None,
+            'bytes': len(body),
+        }
+
+    client = nextis.app.test_client()
+    request_ms, _ = cpu_ms(lambda: client.get(f'/api/clients?location={CITY}').get_data(), args.repeat)
+    results['request_cpu_ms_per_10k'] = round(request_ms * per_10k, 1)
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
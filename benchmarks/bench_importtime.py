@@ -0,0 +1,78 @@
+"""Import-time budget for a web worker.
+
+    python benchmarks/bench_importtime.py --budget-ms 400
+
+Runs `python -X importtime -c "import app"` against a migrated database (as a
+gunicorn worker would) and reports the total import time, peak RSS and the
+slowest top-level imports. Exits 1 if the budget is exceeded or if a module
+that only the ingest/export paths need (pandas, numpy, openpyxl) was loaded.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+PROBE = 'import resource, app; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=400)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('NEXTIS_AUTO_MIGRATE', None)
+    tmp = tempfile.mkdtemp()
+    try:
+        subprocess.run([sys.executable, os.path.join(ROOT, 'manage.py'), 'migrate'],
+                       cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL)
+        probe = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                               cwd=tmp, env=env, check=True, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(tmp)
+
+    entries = parse_importtime(probe.stderr)
+    # Entries are listed after their children: app's direct imports are the
+    # depth-1 entries, and the depth-0 'app' entry is the whole import.
+    total_us = next(cumulative for name, _, cumulative, depth in entries if name == 'app' and depth == 0)
+    top_level = [entry for entry in entries if entry[3] == 1]
+    loaded = {entry[0] for entry in entries}
+    heavy = sorted(name for name in loaded if name.split('.')[0] in HEAVY_MODULES)
+
+    report = {
+        'total_ms': round(total_us / 1000, 1),
+        'budget_ms': args.budget_ms,
+        'maxrss_kb': int(probe.stdout.split()[-1]),
+        'modules': len(loaded),
+        'heavy_modules': heavy[:20],
+        'slowest': [
+            {'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+            for name, _, cumulative, _ in sorted(top_level, key=lambda e: e[2], reverse=True)[:args.top]
+        ],
+    }
+    print(json.dumps(report, indent=2))
+    return 1 if heavy or report['total_ms'] > args.budget_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
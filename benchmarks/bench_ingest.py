@@ -0,0 +1,155 @@
+"""Compare the old whole-file upload path with the chunked ingest engine.
+
+    python benchmarks/bench_ingest.py --rows 500000
+
+Both paths import the same generated workbook into a fresh database (with
+all migrations, so triggers cost the same on both sides).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+
+from utils.db import ConnectionPool
+from utils.search import register_search_functions
+from utils.migrations import apply_migrations
+from utils.ingest import ingest_file
+
+HEADER = ['שם העסק', 'עיר', 'טלפון', 'AnyDesk', 'איש קשר', 'הערות']
+CITIES = ['תל אביב', 'חיפה', 'ירושלים', 'באקה', 'נצרת', 'אילת']
+
+
+def make_workbook(path, rows, seed=1):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(HEADER)
+    for i in range(rows):
+        ws.append([
+            f'עסק {i}',
+            rng.choice(CITIES),
+            f'05{rng.randint(0, 9)}{rng.randint(1000000, 9999999)}',
+            rng.randint(100000000, 999999999),
+            f'איש קשר {rng.randint(1, 500)}',
+            'לקוח ותיק' if rng.random() < 0.3 else None,
+        ])
+    wb.save(path)
+
+
+def fresh_db(path):
+    pool = ConnectionPool(path)
+    pool.on_connect(register_search_functions)
+    conn = pool.connection()
+    apply_migrations(conn, log=None)
+    return conn
+
+
+def legacy_upload(conn, path):
+    """What upload_file did before the ingest engine: process_excel, to_sql"""
+    df = process_excel_legacy(path)
+    df['source_file'] = 'bench.xlsx'
+    df.to_sql('clients', conn, if_exists='append', index=False)
+    return len(df)
+
+
+# The pre-engine import, kept verbatim (minus the CSV branch) so the baseline
+# doesn't pick up later speedups in utils/ingest.py and utils/normalize.py
+
+def format_phone_legacy(phone):
+    if pd.isna(phone) or phone == 'אין':
+        return 'אין'
+    digits = ''.join(filter(str.isdigit, str(phone)))
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    if len(digits) == 10 and digits.startswith('05'):
+        return f"{digits[:3]}-{digits[3:]}"
+    if len(digits) == 9 and digits.startswith('0'):
+        return f"{digits[:2]}-{digits[2:]}"
+    return phone
+
+
+def normalize_city_legacy(city):
+    city = str(city).strip()
+    if 'באקה' in city:
+        return 'באקה אל גרבייה'
+    return city
+
+
+LEGACY_PRIORITIES = {
+    'location': ['עיר', 'city', 'ישוב', 'יישוב', 'מיקום', 'location', 'כתובת', 'address', 'מקום'],
+    'anydesk': ['anydesk', 'אנידסק'],
+    'phone': ['phone', 'mobile', 'cell', 'tel', 'טלפון', 'נייד', 'פלאפון'],
+    'business_name': ['שם עסק', 'שם העסק', 'עסק', 'business', 'company', 'name', 'שם', 'לקוח', 'client'],
+}
+
+
+def process_excel_legacy(path):
+    # pd.read_excel loads the whole workbook (openpyxl in normal mode)
+    df = pd.read_excel(path)
+    df.columns = df.columns.str.strip()
+    rename_map, used_cols = {}, set()
+    for target, keywords in LEGACY_PRIORITIES.items():
+        found_col = None
+        for kw in keywords:
+            for col in df.columns:
+                if col not in used_cols and kw in str(col).lower():
+                    found_col = col
+                    break
+            if found_col:
+                break
+        if found_col:
+            rename_map[found_col] = target
+            used_cols.add(found_col)
+    if rename_map:
+        df.rename(columns=rename_map, inplace=True)
+    # One json.dumps per row, through a Series per row
+    df_filled = df.fillna('').astype(str)
+    df['extra_data'] = df_filled.apply(lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1)
+    for col in ['location', 'anydesk', 'phone', 'business_name']:
+        if col not in df.columns:
+            df[col] = 'אין'
+    df = df[['business_name', 'location', 'phone', 'anydesk', 'extra_data']]
+    df['location'] = df['location'].apply(normalize_city_legacy)
+    df['phone'] = df['phone'].apply(format_phone_legacy)
+    return df
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the new engine')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'bench.xlsx')
+        _, gen_seconds = timed(make_workbook, workbook, args.rows)
+        results = {'rows': args.rows, 'generate_seconds': round(gen_seconds, 2)}
+
+        if not args.skip_legacy:
+            rows, seconds = timed(legacy_upload, fresh_db(os.path.join(tmp, 'legacy.db')), workbook)
+            results['legacy'] = {'rows': rows, 'seconds': round(seconds, 2), 'rows_per_second': round(rows / seconds)}
+
+        outcome = ingest_file(fresh_db(os.path.join(tmp, 'engine.db')), workbook, 'bench.xlsx')
+        results['engine'] = outcome
+        if 'legacy' in results:
+            results['speedup'] = round(results['legacy']['seconds'] / outcome['seconds'], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""JSON encoding and streaming for large client lists.
+
+    python benchmarks/bench_json.py --rows 50000
+
+Loads --rows clients in one city, then times /api/clients?location= through
+the Flask test client: buffered with the stdlib encoder, buffered with the
+orjson provider (if installed), and streamed (?stream=json / ndjson), with the
+time to first byte for the streamed forms. The query cache is bypassed so
+every request rebuilds the list.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CITY = 'חיפה'
+
+
+def timed_get(client, url, repeat):
+    totals, firsts, size = [], [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, buffered=False)
+        chunks = iter(response.response)
+        first = next(chunks, b'')
+        firsts.append(time.perf_counter() - started)
+        size = len(first) + sum(len(chunk) for chunk in chunks)
+        totals.append(time.perf_counter() - started)
+        response.close()
+    return {
+        'ms': round(statistics.median(totals) * 1000, 1),
+        'first_byte_ms': round(statistics.median(firsts) * 1000, 1),
+        'bytes': size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['NEXTIS_AUTO_MIGRATE'] = '1'
+    os.chdir(tempfile.mkdtemp())
+    import app as nextis
+    from flask.json.provider import DefaultJSONProvider
+    from utils.fastjson import FastJSONProvider, orjson
+
+    conn = nextis.get_db_connection()
+    conn.executemany(
+        'INSERT INTO clients (business_name, location, phone, anydesk, extra_data) VALUES (?, ?, ?, ?, ?)',
+        ((f'עסק {i}', CITY, f'050-{i:07d}', str(100000000 + i),
+          json.dumps({'איש קשר': f'איש {i % 97}', 'הערות': 'לקוח ותיק', 'Category': 'Cafe', 'מסגרת': i})) for i in range(args.rows))
+    )
+    conn.commit()
+    nextis.query_cache.max_entries = 0  # rebuild the list on every request
+    client = nextis.app.test_client()
+    with client.session_transaction() as session:
+        session['role'] = 'admin'
+
+    url = f'/api/clients?location={CITY}'
+    results = {'rows': args.rows, 'orjson': orjson is not None}
+    nextis.app.json = DefaultJSONProvider(nextis.app)
+    results['stdlib'] = timed_get(client, url, args.repeat)
+    nextis.app.json = FastJSONProvider(nextis.app)
+    results['provider'] = timed_get(client, url, args.repeat)
+    results['stream_json'] = timed_get(client, url + '&stream=json', args.repeat)
+    results['stream_ndjson'] = timed_get(client, url + '&stream=ndjson', args.repeat)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
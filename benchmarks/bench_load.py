@@ -0,0 +1,376 @@
+"""HTTP load test with the dashboard's traffic mix.
+
+    python benchmarks/bench_load.py --users 8 --duration 30                 # in-process (Flask test client)
+    python benchmarks/bench_load.py --gunicorn 1x1 3x1 3x4 --users 16       # local gunicorn, workers x threads
+    python benchmarks/bench_load.py --url http://127.0.0.1:5001 --username admin --password ...
+
+Virtual users loop over weighted actions modelled on static/js/dashboard.js
+and templates/client.html: debounced search (a prefix, then the word),
+/api/clients/all paging via next_cursor, analytics, detail popups, clients by
+city, the file list, small uploads, and the public projects and reviews
+calls. --public sets the share of anonymous (client.html) users.
+
+Local modes build a database from utils/generate_mock_data.py (--rows) with an
+admin user, in a temp directory. The report (stdout, and --output) gives
+throughput and p50/p95/p99 latency per endpoint, per configuration.
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADMIN_USER = 'loadtest'
+ADMIN_PASSWORD = 'loadtest-password'
+
+# (action, weight) for dashboard users; public users only run PUBLIC_MIX
+DASHBOARD_MIX = [
+    ('search', 30), ('clients_all', 15), ('analytics', 10), ('details', 20),
+    ('clients_location', 8), ('files_list', 4), ('upload', 1), ('projects', 6), ('reviews', 6),
+]
+PUBLIC_MIX = [('projects', 1), ('reviews', 1)]
+SEARCH_WORDS = ['Golden', 'Market', 'הגליל', 'השרון', 'Cafe', 'מסעדה', 'חיפה', '050', 'Star']
+CITIES = ['חיפה', 'תל אביב', 'ירושלים', 'באקה אל גרבייה', 'London']
+
+
+# --- Transports ---------------------------------------------------------------
+
+class HttpTransport:
+    """Keep-alive HTTP/1.1 connection with a cookie jar, one per virtual user"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+        self.cookies = {}
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return response.status, data
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class AppTransport:
+    """Same interface over the Flask test client (no network, one process)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, data=body, headers=headers)
+        data = response.get_data()
+        response.close()
+        return response.status_code, data
+
+    def close(self):
+        pass
+
+
+# --- Virtual users ------------------------------------------------------------
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for name, value in fields.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                  f'Content-Type: text/csv\r\n\r\n'.encode())
+        out.write(content + b'\r\n')
+    out.write(f'--{boundary}--\r\n'.encode())
+    return out.getvalue(), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def small_upload(rng):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['שם העסק', 'עיר', 'טלפון'])
+    for i in range(20):
+        writer.writerow([f'Load {rng.randint(0, 10 ** 9)}', rng.choice(CITIES), f'050{rng.randint(1000000, 9999999)}'])
+    return out.getvalue().encode()
+
+
+class VirtualUser:
+    def __init__(self, transport, rng, public, record):
+        self.http = transport
+        self.rng = rng
+        self.public = public
+        self.record = record
+        self.client_ids = []
+
+    def call(self, label, method, path, body=None, headers=None):
+        started = time.perf_counter()
+        try:
+            status, data = self.http.request(method, path, body, headers)
+        except Exception:
+            status, data = 0, b''
+        self.record(label, time.perf_counter() - started, status)
+        return status, data
+
+    def login(self, username, password):
+        body = urlencode({'username': username, 'password': password})
+        status, _ = self.http.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+        if status not in (200, 302):
+            raise RuntimeError(f'login failed with HTTP {status}')
+        status, data = self.http.request('GET', '/api/clients/all?limit=200&total=false')
+        if status == 200:
+            self.client_ids = [client['id'] for client in json.loads(data).get('data', [])]
+
+    def step(self):
+        mix = PUBLIC_MIX if self.public else DASHBOARD_MIX
+        action = self.rng.choices([a for a, _ in mix], [w for _, w in mix])[0]
+        getattr(self, f'do_{action}')()
+
+    def do_search(self):
+        word = self.rng.choice(SEARCH_WORDS)
+        # The 300ms debounce lets roughly one intermediate prefix through
+        if len(word) > 3 and self.rng.random() < 0.5:
+            self.call('search', 'GET', f'/api/search?q={quote(word[:3])}')
+        self.call('search', 'GET', f'/api/search?q={quote(word)}')
+
+    def do_clients_all(self):
+        path = '/api/clients/all?limit=100'
+        for _ in range(self.rng.randint(1, 3)):
+            status, data = self.call('clients_all', 'GET', path)
+            cursor = json.loads(data).get('next_cursor') if status == 200 else None
+            if not cursor:
+                break
+            path = f'/api/clients/all?limit=100&total=false&cursor={quote(cursor)}'
+
+    def do_analytics(self):
+        self.call('analytics', 'GET', '/api/analytics')
+
+    def do_details(self):
+        if self.client_ids:
+            self.call('details', 'GET', f'/api/clients/details/{self.rng.choice(self.client_ids)}')
+
+    def do_clients_location(self):
+        # First page of the city drill-down, as dashboard.js asks for it
+        self.call('clients_location', 'GET',
+                  f'/api/clients?location={quote(self.rng.choice(CITIES))}&limit=200&sort=business_name')
+
+    def do_files_list(self):
+        self.call('files_list', 'GET', '/api/files/list')
+
+    def do_upload(self):
+        body, headers = multipart({}, [('files', f'load-{uuid.uuid4().hex[:8]}.csv', small_upload(self.rng))])
+        self.call('upload', 'POST', '/api/upload', body, headers)
+
+    def do_projects(self):
+        self.call('projects', 'GET', '/api/projects')
+
+    def do_reviews(self):
+        self.call('reviews', 'GET', '/api/reviews')
+
+
+# --- Running and reporting ----------------------------------------------------
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, seconds):
+    report = {}
+    for label in sorted(samples) + ['TOTAL']:
+        rows = [s for values in samples.values() for s in values] if label == 'TOTAL' else samples[label]
+        latencies = sorted(ms for ms, _ in rows)
+        report[label] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, status in rows if status == 0 or status >= 400),
+            'rps': round(len(rows) / seconds, 1),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else None,
+        }
+    return report
+
+
+def run_load(make_transport, users, duration, public_share, think, seed, username, password):
+    samples = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def record(label, seconds, status):
+        with lock:
+            samples.setdefault(label, []).append((round(seconds * 1000, 2), status))
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        public = index < round(users * public_share)
+        user = VirtualUser(make_transport(), rng, public, record)
+        try:
+            if not public:
+                user.login(username, password)
+            while time.perf_counter() < deadline:
+                user.step()
+                if think:
+                    time.sleep(rng.expovariate(1 / think))
+        finally:
+            user.http.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+def prepare_site(directory, rows, seed):
+    """Database with `rows` generated clients, an admin user, projects and reviews"""
+    from werkzeug.security import generate_password_hash
+
+    from utils.db import ConnectionPool
+    from utils.generate_mock_data import generate_file
+    from utils.ingest import ingest_file
+    from utils.migrations import apply_migrations
+    from utils.search import register_search_functions
+
+    sheet = os.path.join(directory, 'seed.csv')
+    generate_file(sheet, rows, seed)
+    pool = ConnectionPool(os.path.join(directory, 'nexsis.db'))
+    pool.on_connect(register_search_functions)
+    conn = pool.connection()
+    apply_migrations(conn, log=None)
+    ingest_file(conn, sheet, 'seed.csv')
+    conn.execute('INSERT INTO users (username, password, role) VALUES (?, ?, ?)',
+                 (ADMIN_USER, generate_password_hash(ADMIN_PASSWORD, method='pbkdf2:sha256'), 'admin'))
+    for i in range(12):
+        conn.execute('INSERT INTO projects (title, description, image_url) VALUES (?, ?, ?)',
+                     (f'Project {i}', 'תיאור ' * 20, f'/static/img/{i}.jpg'))
+        conn.execute('INSERT INTO reviews (username, rating, comment) VALUES (?, ?, ?)',
+                     (f'user{i}', 1 + i % 5, 'שירות מצוין ' * 5))
+    conn.commit()
+    pool.close_all()
+    os.remove(sheet)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(directory, workers, threads):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=directory, env=env,
+    )
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='load an already running server')
+    target.add_argument('--gunicorn', nargs='+', metavar='WxT',
+                        help='start local gunicorn with W workers and T threads, one run per config')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per run')
+    parser.add_argument('--public', type=float, default=0.25, help='share of anonymous client.html users')
+    parser.add_argument('--think', type=float, default=0, help='mean think time between actions (s)')
+    parser.add_argument('--rows', type=int, default=20000, help='clients in the generated database')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--username', default=ADMIN_USER)
+    parser.add_argument('--password', default=ADMIN_PASSWORD)
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    settings = {k: getattr(args, k) for k in ('users', 'duration', 'public', 'think', 'rows', 'seed')}
+    load = dict(users=args.users, duration=args.duration, public_share=args.public, think=args.think,
+                seed=args.seed, username=args.username, password=args.password)
+    runs = []
+
+    if args.url:
+        runs.append({'config': args.url, 'endpoints': run_load(lambda: HttpTransport(args.url), **load)})
+    else:
+        directory = tempfile.mkdtemp()
+        try:
+            prepare_site(directory, args.rows, args.seed)
+            if args.gunicorn:
+                for config in args.gunicorn:
+                    workers, _, threads = config.partition('x')
+                    process, url = start_gunicorn(directory, int(workers), int(threads or 1))
+                    try:
+                        endpoints = run_load(lambda: HttpTransport(url), **load)
+                    finally:
+                        process.terminate()
+                        process.wait()
+                    runs.append({'config': f'gunicorn {workers}x{threads or 1}', 'endpoints': endpoints})
+            else:
+                os.chdir(directory)
+                import app as nextis
+
+                runs.append({'config': 'in-process', 'endpoints': run_load(lambda: AppTransport(nextis.app), **load)})
+        finally:
+            os.chdir(ROOT)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {'settings': settings, 'runs': runs}
+    for run in runs:
+        print(f"\n{run['config']}")
+        print(f"{'endpoint':18} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for label, row in run['endpoints'].items():
+            print(f"{label:18} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8} "
+                  f"{row['p50_ms']!s:>8} {row['p95_ms']!s:>8} {row['p99_ms']!s:>8}")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
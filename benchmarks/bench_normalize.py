@@ -0,0 +1,67 @@
+"""Micro-benchmark for the vectorized ingest normalizers.
+
+    python benchmarks/bench_normalize.py --rows 100000
+
+Times normalize_city_series and encode_json_records against the row-wise
+apply() code they replaced, on --rows rows. That both give the same values
+is checked by tests/test_normalize.py.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.generate_mock_data import CITIES, phone_number
+from utils.normalize import normalize_city, normalize_city_series
+from utils.ingest import encode_json_records
+
+
+def legacy_json(df_filled):
+    return df_filled.apply(lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return round(time.perf_counter() - started, 4)
+
+
+def bench(rows, seed):
+    rng = random.Random(seed)
+    cities = pd.Series([rng.choice(CITIES) for _ in range(rows)], dtype=object)
+    filled = pd.DataFrame({
+        'שם העסק': [f'עסק {i}' for i in range(rows)],
+        'עיר': cities,
+        'טלפון': [str(phone_number(rng) or '') for _ in range(rows)],
+        'איש קשר': [f'איש קשר {rng.randint(1, 500)}' for _ in range(rows)],
+        'הערות': [rng.choice(['', 'לקוח ותיק', 'a "quoted" note']) for _ in range(rows)],
+    })
+    results = {}
+    for name, legacy, vectorized, data in [
+        ('city', lambda s: s.apply(normalize_city), normalize_city_series, cities),
+        ('extra_data', legacy_json, encode_json_records, filled),
+    ]:
+        before, after = timed(legacy, data), timed(vectorized, data)
+        results[name] = {'apply_seconds': before, 'vectorized_seconds': after,
+                         'speedup': round(before / after, 1) if after else None}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    report = {'rows': args.rows, 'timings': bench(args.rows, args.seed)}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Time a multi-file upload with and without the parse process pool.
+
+    python benchmarks/bench_parallel_ingest.py --files 8 --rows 50000 --workers 4
+
+Each run imports the same generated workbooks into a fresh database through
+ingest_files(); workers=1 is the old one-file-after-another path.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ingest import make_workbook, fresh_db
+from utils.ingest import ingest_files, INGEST_WORKERS
+
+
+def run(tmp, name, files, workers):
+    conn = fresh_db(os.path.join(tmp, f'{name}.db'))
+    started = time.perf_counter()
+    outcomes = ingest_files(conn, files, workers=workers)
+    seconds = time.perf_counter() - started
+    rows = sum(outcome['rows'] for outcome in outcomes)
+    return {
+        'workers': workers,
+        'rows': rows,
+        'errors': sum('error' in outcome for outcome in outcomes),
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=50000, help='rows per file')
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i in range(args.files):
+            path = os.path.join(tmp, f'supplier_{i}.xlsx')
+            make_workbook(path, args.rows, seed=i)
+            files.append((path, os.path.basename(path)))
+
+        # Start the pool outside the timed region, as a running server would have.
+        ingest_files(fresh_db(os.path.join(tmp, 'warmup.db')), files[:2], workers=args.workers)
+
+        results = {
+            'files': args.files,
+            'cpus': os.cpu_count(),
+            'serial': run(tmp, 'serial', files, 1),
+            'parallel': run(tmp, 'parallel', files, args.workers),
+        }
+        results['speedup'] = round(results['serial']['seconds'] / results['parallel']['seconds'], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
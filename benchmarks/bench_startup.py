@@ -0,0 +1,86 @@
+"""Worker boot time vs. database size, with migrations run out of band.
+
+    python benchmarks/bench_startup.py --rows 0 100000 500000
+
+For each size builds a database in the pre-migration layout (clients with
+unformatted phone numbers), times `python manage.py migrate` once, then
+times a fresh interpreter doing `import app` (what every gunicorn worker
+does) --repeat times. Migration cost grows with the table; boot should not.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.db import ConnectionPool
+from utils.migrations import MIGRATIONS
+
+DB_NAME = 'nexsis.db'  # app.config['DB_NAME'], relative to the working directory
+
+
+def legacy_db(path, rows, seed=1):
+    """Database with only the first migration applied and `rows` clients"""
+    rng = random.Random(seed)
+    conn = ConnectionPool(path).connection()
+    first = MIGRATIONS[0]
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY, name TEXT, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    first.func(conn)
+    conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (first.version, first.name))
+    conn.executemany(
+        'INSERT INTO clients (business_name, location, phone, anydesk) VALUES (?, ?, ?, ?)',
+        ((f'עסק {i}', 'חיפה', f'+9725{rng.randint(0, 9)}{rng.randint(1000000, 9999999)}',
+          str(rng.randint(100000000, 999999999))) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(argv, cwd, env=None):
+    started = time.perf_counter()
+    subprocess.run(argv, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[0, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('NEXTIS_AUTO_MIGRATE', None)
+    results = []
+    for rows in args.rows:
+        tmp = tempfile.mkdtemp()
+        try:
+            legacy_db(os.path.join(tmp, DB_NAME), rows)
+            migrate = timed([sys.executable, os.path.join(ROOT, 'manage.py'), '--db', DB_NAME, 'migrate'], tmp, env)
+            boots = [timed([sys.executable, '-c', 'import app'], tmp, env) for _ in range(args.repeat)]
+        finally:
+            shutil.rmtree(tmp)
+        results.append({
+            'rows': rows,
+            'migrate_seconds': round(migrate, 3),
+            'boot_seconds_median': round(statistics.median(boots), 3),
+            'boot_seconds_max': round(max(boots), 3),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
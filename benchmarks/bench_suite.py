@@ -0,0 +1,170 @@
+"""Benchmark suite: ingest, search, analytics, detail merge and export per
+dataset size.
+
+    python benchmarks/bench_suite.py --tiers 1000 10000 100000 --output results.json
+    python benchmarks/bench_suite.py --tiers 1000 10000 --compare results.json
+
+Each tier generates a sheet with utils/generate_mock_data.py (fixed seed, so
+runs are comparable), imports it into a fresh database and times the read
+paths the app serves. Results are JSON, tagged with the git commit, Python
+and SQLite versions; --compare prints the ratio against an earlier run and
+exits 1 if any timing got slower than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ingest import fresh_db
+from utils.export import available_columns, iter_export_rows, stream_csv
+from utils.generate_mock_data import CITIES, NAME_WORDS, generate_file
+from utils.ingest import ingest_file
+from utils.profiles import client_profile
+from utils.rollups import STATS_SQL
+from utils.search import search_clients
+
+
+def median_ms(func, repeat):
+    """Median wall time of func() over `repeat` calls, in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def analytics(conn):
+    # The queries behind /api/analytics (rollup tables)
+    conn.execute(STATS_SQL).fetchone()
+    conn.execute('SELECT location, count FROM location_stats ORDER BY count DESC LIMIT 10').fetchall()
+
+
+def export_all(conn):
+    columns = available_columns(conn)
+    return sum(len(chunk) for chunk in stream_csv(columns, iter_export_rows(conn, columns)))
+
+
+def run_tier(tmp, rows, file_format, repeat, seed):
+    path = os.path.join(tmp, f'clients_{rows}.{file_format}')
+    started = time.perf_counter()
+    generate_file(path, rows, seed)
+    generate_seconds = time.perf_counter() - started
+
+    conn = fresh_db(os.path.join(tmp, f'bench_{rows}.db'))
+    outcome = ingest_file(conn, path, os.path.basename(path))
+
+    rng = random.Random(seed)
+    max_id = conn.execute('SELECT MAX(id) FROM clients').fetchone()[0] or 1
+    sample_ids = [rng.randint(1, max_id) for _ in range(repeat)]
+    queries = [rng.choice(NAME_WORDS) for _ in range(repeat)] + [CITIES[0], '050', 'Market 1']
+
+    def detail_cold():
+        conn.execute('UPDATE business_profiles SET computed_version = 0')
+        conn.commit()
+        for client_id in sample_ids:
+            client_profile(conn, client_id)
+
+    def detail_warm():
+        for client_id in sample_ids:
+            client_profile(conn, client_id)
+
+    results = {
+        'rows': rows,
+        'format': file_format,
+        'generate_seconds': round(generate_seconds, 3),
+        'ingest_seconds': outcome['seconds'],
+        'ingest_rows_per_second': round(rows / outcome['seconds']) if outcome['seconds'] else None,
+        'search_ms': median_ms(lambda: [search_clients(conn, q) for q in queries], repeat),
+        'search_location_ms': median_ms(
+            lambda: conn.execute('SELECT * FROM clients WHERE location = ?', (CITIES[1],)).fetchall(), repeat),
+        'analytics_ms': median_ms(lambda: analytics(conn), repeat),
+        'detail_cold_ms': median_ms(detail_cold, max(1, repeat // 3)),
+        'detail_warm_ms': median_ms(detail_warm, repeat),
+        'fields_ms': median_ms(lambda: available_columns(conn), max(1, repeat // 3)),
+        'export_seconds': round(median_ms(lambda: export_all(conn), 1) / 1000, 3),
+    }
+    conn.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous, tolerance):
+    """Print per-metric ratios (current / previous); returns the regressions"""
+    baseline = {tier['rows']: tier for tier in previous['tiers']}
+    regressions = []
+    for tier in current['tiers']:
+        old = baseline.get(tier['rows'])
+        if old is None:
+            continue
+        for metric, value in tier.items():
+            if not (metric.endswith('_ms') or metric.endswith('_seconds')) or metric == 'generate_seconds':
+                continue
+            if not value or not old.get(metric):
+                continue
+            ratio = value / old[metric]
+            flag = 'SLOWER' if ratio > tolerance else ''
+            print(f"{tier['rows']:>9} {metric:24} {old[metric]:>10} -> {value:>10}  x{ratio:.2f} {flag}")
+            if flag:
+                regressions.append((tier['rows'], metric, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tiers', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='dataset sizes in rows (up to millions)')
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--repeat', type=int, default=9, help='samples per read timing')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON results here as well as to stdout')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown ratio treated as a regression')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'tiers': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.tiers:
+            report['tiers'].append(run_tier(tmp, rows, args.format, args.repeat, args.seed))
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
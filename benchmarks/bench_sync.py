@@ -0,0 +1,60 @@
+"""Weekly re-import of a supplier sheet: append everything vs. sync the diff.
+
+    python benchmarks/bench_sync.py --rows 100000 --changed 0.01
+
+Imports a generated workbook, then a second version with --changed of its
+rows edited, once with mode='append' and once with mode='sync'.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openpyxl import load_workbook
+
+from bench_ingest import make_workbook, fresh_db
+from utils.ingest import ingest_file
+
+
+def edit_workbook(source, target, fraction, seed=2):
+    """Copy source with `fraction` of its data rows given a new note"""
+    rng = random.Random(seed)
+    workbook = load_workbook(source)
+    sheet = workbook.active
+    for row in sheet.iter_rows(min_row=2):
+        if rng.random() < fraction:
+            row[-1].value = f'עודכן {rng.randint(1, 10 ** 6)}'
+    workbook.save(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--changed', type=float, default=0.01, help='fraction of rows edited in week 2')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        week1 = os.path.join(tmp, 'week1.xlsx')
+        week2 = os.path.join(tmp, 'week2.xlsx')
+        make_workbook(week1, args.rows)
+        edit_workbook(week1, week2, args.changed)
+
+        results = {'rows': args.rows, 'changed': args.changed}
+        for mode in ('append', 'sync'):
+            conn = fresh_db(os.path.join(tmp, f'{mode}.db'))
+            ingest_file(conn, week1, 'supplier.xlsx')
+            outcome = ingest_file(conn, week2, 'supplier.xlsx', mode=mode)
+            outcome['clients_after'] = conn.execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+            results[mode] = outcome
+        results['speedup'] = round(results['append']['seconds'] / results['sync']['seconds'], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,6 @@ data = {
     'Last Order Date': ['2025-12-31']
 }
 df = pd.DataFrame(data)
-output_path = '/Users/basharmawase/Nexsis/test_full_data.xlsx'
+output_path = 'test_full_data.xlsx'
 df.to_excel(output_path, index=False)
 print(f"Created {output_path}")
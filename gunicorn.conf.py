@@ -0,0 +1,9 @@
+# Read by `gunicorn app:app` from the working directory.
+
+
+def post_fork(server, worker):
+    # Every worker imports its own uploads (utils/jobs.py); threads don't
+    # survive a fork, so they are started here rather than at import
+    from app import job_queue
+
+    job_queue.start()
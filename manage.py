@@ -0,0 +1,94 @@
+"""Maintenance commands for the Nextis database.
+
+    python manage.py status     # applied / pending migrations
+    python manage.py migrate    # apply pending migrations
+    python manage.py explain    # EXPLAIN QUERY PLAN for every hot query
+    python manage.py rollups verify|rebuild   # analytics rollup drift check
+"""
+import argparse
+import os
+import sys
+
+from utils.db import ConnectionPool
+from utils.search import register_search_functions
+from utils.migrations import MIGRATIONS, applied_versions, apply_migrations
+from utils.query_plans import explain_hot_queries
+from utils.rollups import rebuild_rollups, verify_rollups
+
+DEFAULT_DB = 'nexsis.db'
+
+
+def open_db(db_path):
+    pool = ConnectionPool(db_path)
+    pool.on_connect(register_search_functions)
+    return pool.connection()
+
+
+def cmd_status(conn, args):
+    done = applied_versions(conn)
+    for m in MIGRATIONS:
+        print(f"{'applied' if m.version in done else 'PENDING':8} {m.version:3} {m.name}")
+    pending = [m for m in MIGRATIONS if m.version not in done]
+    print(f'{len(pending)} pending migration(s)')
+    return 1 if pending and args.check else 0
+
+
+def cmd_migrate(conn, args):
+    applied = apply_migrations(conn)
+    if not applied:
+        print('Nothing to apply')
+    return 0
+
+
+def cmd_explain(conn, args):
+    # The app registers most hot queries (utils/query_plans.py) as it loads
+    os.environ['NEXTIS_DB'] = args.db
+    try:
+        import app
+    except RuntimeError as e:  # pending migrations
+        print(e)
+        return 1
+    bad = 0
+    for name, sql, plan, scan in explain_hot_queries(conn):
+        print(f"{'!! TABLE SCAN' if scan else 'ok':13} {name}")
+        print(f"    {' '.join(sql.split())}")
+        for line in plan:
+            print(f'      {line}')
+        bad += scan
+    print(f'{bad} hot query(s) fall back to a table scan')
+    return 1 if bad else 0
+
+
+def cmd_rollups(conn, args):
+    if args.action == 'rebuild':
+        conn.execute('BEGIN IMMEDIATE')
+        rebuild_rollups(conn)
+        conn.commit()
+        print('Rollups rebuilt')
+    problems = verify_rollups(conn)
+    for problem in problems:
+        print(f'DRIFT {problem}')
+    print('Rollups OK' if not problems else f'{len(problems)} problem(s) found')
+    return 1 if problems else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Nextis database maintenance')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite database path (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    status = sub.add_parser('status', help='list applied and pending migrations')
+    status.add_argument('--check', action='store_true', help='exit 1 if anything is pending')
+    status.set_defaults(func=cmd_status)
+    sub.add_parser('migrate', help='apply pending migrations').set_defaults(func=cmd_migrate)
+    sub.add_parser('explain', help='show query plans for hot queries').set_defaults(func=cmd_explain)
+    rollups = sub.add_parser('rollups', help='verify or rebuild the analytics rollups')
+    rollups.add_argument('action', choices=['verify', 'rebuild'])
+    rollups.set_defaults(func=cmd_rollups)
+
+    args = parser.parse_args(argv)
+    conn = open_db(args.db)
+    return args.func(conn, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
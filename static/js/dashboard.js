@@ -55,25 +55,59 @@ function formatPhoneDisplay(phone) {
 
 
 // City Search Logic
+// The city drill-down loads a page of clients at a time, sorted by name
+const CITY_PAGE_SIZE = 200;
+const CITY_SEARCH_LIMIT = 100;
 let currentCityClients = [];
+let currentCityLocation = null;
+let cityNextCursor = null;
+let cityTotal = 0;
+let citySearchTimeout;
 const citySearchInput = document.getElementById('citySearchInput');
 
 if (citySearchInput) {
     citySearchInput.addEventListener('input', (e) => {
+        clearTimeout(citySearchTimeout);
         const query = e.target.value.toLowerCase().trim();
         if (!currentCityClients) return;
 
+        const listContainer = document.getElementById('locationClientsList');
+        if (!query) {
+            displaySearchResults(currentCityClients, listContainer);
+            renderCityLoadMore(listContainer);
+            return;
+        }
+
+        // Only some pages are loaded: search the whole city on the server
+        if (cityNextCursor) {
+            citySearchTimeout = setTimeout(() => searchCity(query, listContainer), 300);
+            return;
+        }
+
         const filtered = currentCityClients.filter(c => {
             const name = (c.business_name || c['Business Name'] || '').toLowerCase();
             const phone = (c.phone || c.Phone || '').toLowerCase();
             return name.includes(query) || phone.includes(query);
         });
-
-        const listContainer = document.getElementById('locationClientsList');
         displaySearchResults(filtered, listContainer);
     });
 }
 
+async function searchCity(query, container) {
+    const location = currentCityLocation;
+    const params = new URLSearchParams({ q: query, location, fields: 'business_name,phone', limit: CITY_SEARCH_LIMIT });
+    try {
+        const response = await fetch(`/api/search?${params}`);
+        const results = await response.json();
+        if (!response.ok) throw new Error(results.error || response.statusText);
+        // Another city or query may have been opened/typed meanwhile
+        if (location !== currentCityLocation || citySearchInput.value.toLowerCase().trim() !== query) return;
+        displaySearchResults(results, container);
+    } catch (error) {
+        console.error('City search error:', error);
+    }
+}
+
 // Check if data already exists on load
 document.addEventListener('DOMContentLoaded', () => {
     loadAnalytics();
@@ -129,7 +163,7 @@ async function loadUploadedFiles() {
                 font-size: 14px;
                 transition: all 0.2s;
             `;
-            deleteBtn.onclick = () => deleteUploadedFile(file.name);
+            deleteBtn.onclick = () => deleteUploadedFile(file.name, file.id);
             deleteBtn.onmouseover = () => {
                 deleteBtn.style.background = 'rgba(220, 38, 38, 0.2)';
             };
@@ -152,14 +186,14 @@ function formatFileSize(bytes) {
     else return (bytes / 1048576).toFixed(1) + ' MB';
 }
 
-async function deleteUploadedFile(filename) {
+async function deleteUploadedFile(filename, id) {
     if (!confirm(`האם למחוק את הקובץ "${filename}"?`)) return;
 
     try {
         const response = await fetch('/api/files/delete', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ filename })
+            body: JSON.stringify({ filename, id })
         });
 
         const data = await response.json();
@@ -209,6 +243,11 @@ async function uploadFiles(files) {
     for (let i = 0; i < files.length; i++) {
         formData.append('files', files[i]);
     }
+    // Re-import: replace the rows previously imported from a file of the same name
+    const syncImport = document.getElementById('syncImport');
+    if (syncImport && syncImport.checked) {
+        formData.append('mode', 'sync');
+    }
 
     try {
         uploadBox.innerHTML = '<p>מעלה ומעבד...</p>';
@@ -221,9 +260,28 @@ async function uploadFiles(files) {
         const data = await response.json();
 
         if (data.success) {
+            if (data.duplicates.length > 0) {
+                alert('קבצים שכבר יובאו דולגו: ' + data.duplicates.map(d => d.file).join(', '));
+            }
+            if (!data.status_url) {
+                loadUploadedFiles();
+                resetUploadBox();
+                return;
+            }
+            // The server imports in the background; follow the job until it finishes
+            const job = await waitForJob(data.status_url);
             loadAnalytics();
             loadUploadedFiles();
             resetUploadBox();
+            if (job.status === 'failed') {
+                alert('שגיאה בהעלאת קובץ: ' + job.error);
+            } else if (job.errors.length > 0) {
+                alert('שגיאה בהעלאת קובץ: ' + job.errors.join('; '));
+            } else if (job.options.mode === 'sync') {
+                const summary = job.files.map(f =>
+                    `${f.file}: ${f.inserted} נוספו, ${f.updated} עודכנו, ${f.deleted} נמחקו, ${f.unchanged} ללא שינוי`);
+                alert(summary.join('\n'));
+            }
         } else {
             alert('שגיאה בהעלאת קובץ: ' + data.error);
             resetUploadBox();
@@ -235,6 +293,23 @@ async function uploadFiles(files) {
     }
 }
 
+async function waitForJob(statusUrl) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error);
+        }
+        if (job.status === 'done' || job.status === 'failed') {
+            return job;
+        }
+        const queued = job.status === 'queued' ? ' (בתור)' : '';
+        uploadBox.innerHTML = `<p>מעבד קבצים${queued}: ${job.files_done}/${job.files_total}</p>
+            <p class="file-limit">${job.rows_inserted.toLocaleString()} שורות נוספו</p>`;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 function resetUploadBox() {
     uploadBox.innerHTML = `
         <p>גרור ושחרר קבצים כאן</p>
@@ -1004,16 +1079,13 @@ async function openLocationDetails(location) {
     // Reset search
     if (citySearchInput) citySearchInput.value = '';
 
-    try {
-        const response = await fetch(`/api/clients?location=${encodeURIComponent(location)}`);
-        const clients = await response.json();
-
-        currentCityClients = clients; // Store for filtering
-        displaySearchResults(clients, listContainer);
-
-        // Render city data matrix
-        renderCityMatrix(clients);
+    currentCityLocation = location;
+    currentCityClients = [];
+    cityNextCursor = null;
+    cityTotal = 0;
 
+    try {
+        await loadCityPage(location);
     } catch (error) {
         console.error('Error fetching clients:', error);
         listContainer.innerHTML = '<p style="color:red">שגיאה בטעינת לקוחות.</p>';
@@ -1022,6 +1094,49 @@ async function openLocationDetails(location) {
 
 }
 
+async function loadCityPage(location) {
+    const params = new URLSearchParams({ location, limit: CITY_PAGE_SIZE, sort: 'business_name' });
+    if (cityNextCursor) params.set('cursor', cityNextCursor);
+    const response = await fetch(`/api/clients?${params}`);
+    const page = await response.json();
+    if (!response.ok) throw new Error(page.error || response.statusText);
+    if (location !== currentCityLocation) return; // another city was opened meanwhile
+
+    currentCityClients = currentCityClients.concat(page.data); // Store for filtering
+    cityNextCursor = page.next_cursor;
+    cityTotal = page.total;
+
+    const listContainer = document.getElementById('locationClientsList');
+    if (citySearchInput) citySearchInput.value = '';
+    displaySearchResults(currentCityClients, listContainer);
+    renderCityLoadMore(listContainer);
+
+    // Render city data matrix (the loaded pages; "load more" extends it)
+    renderCityMatrix(currentCityClients);
+    const matrixCount = document.getElementById('cityMatrixCount');
+    if (matrixCount) {
+        matrixCount.textContent = cityNextCursor ? `(${currentCityClients.length} מתוך ${cityTotal})` : '';
+    }
+}
+
+function renderCityLoadMore(container) {
+    if (!cityNextCursor) return;
+    const button = document.createElement('button');
+    button.className = 'btn-primary';
+    button.style.marginTop = '16px';
+    button.textContent = `טען עוד (${currentCityClients.length} מתוך ${cityTotal})`;
+    button.onclick = async () => {
+        button.disabled = true;
+        try {
+            await loadCityPage(currentCityLocation);
+        } catch (error) {
+            console.error('Error fetching clients:', error);
+            button.disabled = false;
+        }
+    };
+    container.appendChild(button);
+}
+
 function renderCityMatrix(clients) {
     const tableBody = document.getElementById('cityTableBody');
     const tableHeader = document.getElementById('cityTableHeader');
@@ -1106,6 +1221,10 @@ function renderCityMatrix(clients) {
 // Data Matrix Logic
 let currentPage = 1;
 const limit = 100;  // Increased to show more data per page
+// Keyset paging: the server hands back cursors for the neighbouring pages
+let matrixCursor = '';
+let nextCursor = null;
+let prevCursor = null;
 
 async function loadMatrix() {
     const tableBody = document.getElementById('tableBody');
@@ -1113,16 +1232,20 @@ async function loadMatrix() {
     tableBody.innerHTML = '<tr><td colspan="100%" style="text-align:center; padding: 20px;">טוען נתונים...</td></tr>';
 
     try {
-        const response = await fetch(`/api/clients/all?page=${currentPage}&limit=${limit}`);
+        let url = `/api/clients/all?page=${currentPage}&limit=${limit}`;
+        if (matrixCursor) url += `&cursor=${encodeURIComponent(matrixCursor)}`;
+        const response = await fetch(url);
         const data = await response.json();
 
         renderMatrix(data.data);
 
         // Update pagination
+        nextCursor = data.next_cursor;
+        prevCursor = data.prev_cursor;
         const totalPages = Math.ceil(data.total / data.per_page) || 1;
         document.getElementById('pageInfo').textContent = `עמוד ${data.page} מתוך ${totalPages}`;
-        document.getElementById('prevPage').disabled = data.page <= 1;
-        document.getElementById('nextPage').disabled = data.page >= totalPages;
+        document.getElementById('prevPage').disabled = !prevCursor;
+        document.getElementById('nextPage').disabled = !nextCursor;
 
         // Show section if hidden
         document.getElementById('matrixSection').style.display = 'block';
@@ -1217,8 +1340,15 @@ function renderMatrix(rows) {
 }
 
 function changePage(delta) {
+    const cursor = delta > 0 ? nextCursor : prevCursor;
+    if (!cursor) return;
     currentPage += delta;
-    if (currentPage < 1) currentPage = 1;
+    if (currentPage <= 1) {
+        currentPage = 1;
+        matrixCursor = '';
+    } else {
+        matrixCursor = cursor;
+    }
     loadMatrix();
 }
 
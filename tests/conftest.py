@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def nextis(tmp_path_factory):
+    """app.py imported against a fresh, migrated database in a temp directory"""
+    os.chdir(tmp_path_factory.mktemp('nextis'))
+    os.environ['NEXTIS_AUTO_MIGRATE'] = '1'
+    import app
+    return app
+
+
+@pytest.fixture
+def client(nextis):
+    return nextis.app.test_client()
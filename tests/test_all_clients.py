@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize('args', [{'page': 'x'}, {'limit': 'ten'}])
+def test_bad_page_or_limit_is_rejected(client, args):
+    response = client.get('/api/clients/all', query_string=args)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid page or limit'}
+
+
+@pytest.mark.parametrize('args, limit', [({'limit': -5}, 1), ({'limit': 0}, 1), ({'limit': 10 ** 6}, 1000)])
+def test_page_and_limit_are_clamped(client, args, limit):
+    response = client.get('/api/clients/all', query_string={'page': -3, **args})
+    assert response.status_code == 200
+    assert (response.get_json()['page'], response.get_json()['per_page']) == (1, limit)
@@ -0,0 +1,25 @@
+import json
+
+CITY = 'עכו'
+
+
+def add_client(nextis, **extra):
+    conn = nextis.get_db_connection()
+    conn.execute(
+        'INSERT INTO clients (business_name, location, phone, anydesk, source_file, extra_data) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        ('Golden Cafe', CITY, '052-1234567', '123456789', 'test.xlsx', json.dumps(extra, ensure_ascii=False))
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_projection_keeps_the_full_merge_precedence(nextis, client):
+    add_client(nextis, phone='0521234567', הערות='לקוח ותיק')
+    merged = client.get('/api/clients', query_string={'location': CITY}).get_json()
+    assert merged[0]['phone'] == '0521234567'
+
+    for fields in ('phone', 'phone,הערות', 'id,phone'):
+        page = client.get('/api/clients', query_string={'location': CITY, 'limit': 10, 'fields': fields}).get_json()
+        wanted = fields.split(',')
+        assert page['data'] == [{field: merged[0][field] for field in wanted}]
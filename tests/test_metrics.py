@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+
+from utils.metrics import Metrics
+
+
+def test_concurrent_flushes(tmp_path):
+    metrics = Metrics(str(tmp_path), flush_interval=0)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(200):
+                metrics.inc('nextis_http_requests_total', {'endpoint': 'x'})
+                metrics.maybe_flush()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.flush()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == [f'{os.getpid()}.json']
+    with open(tmp_path / f'{os.getpid()}.json') as f:
+        assert list(json.load(f)['counters'].values()) == [1600]
+
+
+def test_slow_query_report_rejects_a_bad_limit(client):
+    with client.session_transaction() as session:
+        session['role'] = 'admin'
+    assert client.get('/api/admin/slow-queries?limit=x').status_code == 400
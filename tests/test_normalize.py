@@ -0,0 +1,63 @@
+"""The vectorized ingest normalizers give exactly the values (and Python
+types) of the row-wise apply() code they replaced, on randomized input."""
+import json
+import math
+import random
+
+import pandas as pd
+import pytest
+
+from utils.ingest import encode_json_records
+from utils.normalize import normalize_city, normalize_city_series
+
+TRIALS = 300
+
+CITY_SHAPES = [
+    lambda r: r.choice(['תל אביב', 'חיפה', ' ירושלים ', 'נצרת']),
+    lambda r: r.choice(['באקה', 'באקה אל גרבייה', ' באקה-אל-גרביה', 'ג\'ת באקה']),
+    lambda r: r.choice(['Haifa', 'TLV ', '']),
+    lambda r: None,
+    lambda r: float('nan'),
+    lambda r: r.choice([1, 1.0, True, 2.5]),
+]
+
+VALUE_SHAPES = [
+    lambda r: r.choice(['שלום', 'a"b', 'back\\slash', 'line\nbreak', 'tab\there', '\x01ctrl', '😀', '']),
+    lambda r: r.randint(-5, 10 ** 12),
+    lambda r: r.random() * 1000,
+    lambda r: None,
+    lambda r: float('nan'),
+    lambda r: pd.Timestamp('2025-12-31'),
+]
+
+LABELS = ['שם העסק', 'עיר', 'phone', 'a"b', 5, 2.5, 'dup', 'dup', 'Unnamed: 3', 'ק\\ל']
+
+
+def typed(values):
+    """Values with their types, NaN made comparable"""
+    return [(type(v), 'NaN' if isinstance(v, float) and math.isnan(v) else v) for v in values]
+
+
+def random_frame(rng, n):
+    labels = rng.sample(LABELS, rng.randint(1, len(LABELS)))
+    if rng.random() < 0.3:
+        labels.append(labels[0])
+    df = pd.DataFrame([[rng.choice(VALUE_SHAPES)(rng) for _ in labels] for _ in range(n)], dtype=object)
+    df.columns = labels
+    return df
+
+
+@pytest.mark.parametrize('seed', range(TRIALS))
+def test_normalize_city_series(seed):
+    rng = random.Random(seed)
+    cities = pd.Series([rng.choice(CITY_SHAPES)(rng) for _ in range(rng.randint(1, 60))], dtype=object)
+    assert typed(normalize_city_series(cities)) == typed(cities.apply(normalize_city))
+
+
+@pytest.mark.parametrize('seed', range(TRIALS))
+def test_encode_json_records(seed):
+    rng = random.Random(seed)
+    # Same preparation as normalize_frame: fillna('') then astype(str)
+    filled = random_frame(rng, rng.randint(1, 60)).fillna('').astype(str)
+    expected = filled.apply(lambda row: json.dumps(row.to_dict(), ensure_ascii=False), axis=1)
+    assert encode_json_records(filled).tolist() == expected.tolist()
@@ -0,0 +1,9 @@
+from utils.query_plans import HOT_QUERIES, explain_hot_queries
+
+
+def test_hot_queries_use_indexes(nextis):
+    conn = nextis.get_db_connection()
+    report = explain_hot_queries(conn)
+    conn.close()
+    assert len(report) == len(HOT_QUERIES) > 0
+    assert [name for name, _, _, scan in report if scan] == []
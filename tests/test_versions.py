@@ -0,0 +1,21 @@
+from utils.generate_mock_data import generate_file
+from utils.ingest import ingest_file
+from utils.versions import table_versions
+
+
+def test_resyncing_unchanged_rows_keeps_the_clients_version(nextis, tmp_path):
+    sheet = str(tmp_path / 'suppliers.csv')
+    generate_file(sheet, 20, seed=3)
+    conn = nextis.get_db_connection()
+    ingest_file(conn, sheet, 'suppliers.csv', mode='sync', upload='a' * 64)
+    before = table_versions(conn, 'clients')
+
+    counts = ingest_file(conn, sheet, 'suppliers.csv', mode='sync', upload='b' * 64)
+    assert counts['unchanged'] == 20
+    assert conn.execute("SELECT COUNT(*) FROM clients WHERE upload_sha256 = ?", ('b' * 64,)).fetchone()[0] == 20
+    assert table_versions(conn, 'clients') == before
+
+    conn.execute("UPDATE clients SET phone = '050-0000000' WHERE source_file = 'suppliers.csv'")
+    conn.commit()
+    assert table_versions(conn, 'clients') != before
+    conn.close()
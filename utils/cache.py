@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+# In-process cache for read helpers. Entries are tagged with the tables they
+# were built from; write routes drop them with invalidate(tag), and when a
+# version source is given every hit is also checked against the tables'
+# change counters (utils/versions.py), so writes made by another worker or a
+# background import are never served stale. Bounded by entry count, by an
+# estimate of the memory held and by a TTL.
+
+
+def _freeze(value):
+    """Hashable, order-insensitive form of an argument"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _size(value):
+    """Rough byte size of a cached value; pre-encoded JSON (bytes) counts as
+    its length, tuples/lists as the sum of their parts"""
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_size(part) for part in value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class QueryCache:
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, ttl=300, version_source=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_source = version_source
+        self._entries = OrderedDict()  # key -> (value, tags, versions, expires, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'invalidations': 0}
+
+    def cached(self, *tags, ttl=None):
+        """Decorator: cache func's result per normalized arguments"""
+        def decorator(func):
+            name = f'{func.__module__}.{func.__qualname__}'
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (name, _freeze(args), _freeze(kwargs))
+                versions = self.version_source(tags) if self.version_source else None
+                found, value = self.get(key, versions)
+                if found:
+                    return value
+                value = func(*args, **kwargs)
+                self.put(key, value, tags, versions, ttl)
+                return value
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def get(self, key, versions=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return False, None
+            value, _, stored_versions, expires, _ = entry
+            if expires < time.monotonic() or stored_versions != versions:
+                self._counters['stale'] += 1
+                self._counters['misses'] += 1
+                self._drop(key)
+                return False, None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return True, value
+
+    def put(self, key, value, tags, versions=None, ttl=None):
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+            self._entries[key] = (value, frozenset(tags), versions, expires, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def invalidate(self, *tags):
+        """Drop every entry built from any of tags (all entries if none given)"""
+        with self._lock:
+            doomed = [key for key, entry in self._entries.items() if not tags or entry[1] & set(tags)]
+            for key in doomed:
+                self._drop(key)
+            self._counters['invalidations'] += len(doomed)
+        return len(doomed)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[4]
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else None,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,95 @@
+import json
+
+# Client rows as JSON text without a parse/re-encode round trip. extra_data is
+# stored as JSON text (utils/ingest.py); the list endpoints used to json.loads
+# every blob, merge it into a dict and encode the dict again. Instead SQLite
+# writes the base columns as a JSON object and classifies the stored text
+# (valid? an object?) in C, and Python splices the stored members into the
+# object as bytes. The result goes into the response as is
+# (utils/fastjson.py, encoded=True).
+#
+# Ingested rows also store the base columns under their own names
+# (business_name, phone, ...), so the dict.update() merge happens in SQL: a
+# stored key that overrides a column replaces the column's value in place,
+# and it (like any key the merge drops) is cut from the spliced text with
+# json_remove. Only text json_valid rejects (Python also reads NaN/Infinity)
+# is merged in Python as before.
+
+# extra_state
+EMPTY, OBJECT, OTHER, MERGE = 0, 1, 2, 3
+
+
+def _path(key):
+    return f"""'$."{key}"'"""
+
+
+def client_sql(columns, overrides=(), dropped=()):
+    """Select list giving client_json (columns as a JSON object), extra_json
+    (the stored text without overrides and dropped keys) and extra_state:
+    EMPTY, OBJECT (safe to splice), OTHER (valid JSON, not an object) or
+    MERGE (invalid). A stored key listed in overrides wins over the column
+    of that name, as dict.update() would; dropped keys are never taken from
+    the stored text."""
+    def value(column):
+        if column not in overrides:
+            return column
+        # -> is NULL for a missing key and JSON (number, object, null...)
+        # otherwise; it raises on invalid text, hence the CASE
+        return (f'CASE WHEN json_valid(extra_data) THEN COALESCE(extra_data -> {_path(column)}, {column}) '
+                f'ELSE {column} END')
+
+    obj = 'json_object(' + ', '.join(f"'{column}', {value(column)}" for column in columns) + ')'
+    extra = 'extra_data'
+    removed = tuple(overrides) + tuple(dropped)
+    if removed:
+        paths = ', '.join(_path(key) for key in removed)
+        extra = f'''CASE
+            WHEN NOT json_valid(extra_data) THEN extra_data
+            WHEN json_type(extra_data) != 'object' THEN extra_data
+            ELSE json_remove(extra_data, {paths})
+        END'''
+    # json_type reuses the parse json_valid just made
+    state = f'''CASE
+        WHEN extra_data IS NULL OR extra_data = '' THEN {EMPTY}
+        WHEN NOT json_valid(extra_data) THEN {MERGE}
+        WHEN json_type(extra_data) != 'object' THEN {OTHER}
+        ELSE {OBJECT}
+    END'''
+    return f'CAST({obj} AS BLOB) AS client_json, CAST({extra} AS BLOB) AS extra_json, {state} AS extra_state'
+
+
+def _stored(row):
+    extra = row['extra_json'].strip()
+    # A raw newline can only be whitespace in valid JSON; NDJSON needs one line
+    return extra.replace(b'\n', b' ') if b'\n' in extra else extra
+
+
+def splice_members(row):
+    """client_json with the stored object's members added (as dict.update()
+    would), or None if the row has to be merged in Python"""
+    state = row['extra_state']
+    if state == OBJECT:
+        members = _stored(row)[1:-1].strip()
+        if members:
+            return row['client_json'][:-1] + b',' + members + b'}'
+    elif state == MERGE:
+        return None
+    return row['client_json']
+
+
+def splice_nested(row, key):
+    """client_json with the stored object added under key, or None if the row
+    has to be handled in Python"""
+    state = row['extra_state']
+    if state == OBJECT:
+        return row['client_json'][:-1] + b',"' + key.encode() + b'":' + _stored(row) + b'}'
+    if state == MERGE:
+        return None
+    return row['client_json']
+
+
+def unspliced(row):
+    """The row as a dict of its columns and raw extra_data, for the Python path"""
+    client = json.loads(row['client_json'])
+    client['extra_data'] = row['extra_json'].decode() if row['extra_json'] is not None else None
+    return client
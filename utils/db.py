@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Tuning applied to every pooled connection. WAL lets readers run alongside
+# the single writer, and busy_timeout makes writers wait for the lock instead
+# of failing straight away with "database is locked".
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,       # negative = KiB, so ~64MB of page cache
+    'mmap_size': 268435456,     # 256MB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# sqlite3 keeps an LRU of prepared statements per connection; the default of
+# 128 is too small once every route's queries are counted.
+STATEMENT_CACHE_SIZE = 512
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to the pool's statement hooks.
+
+    A statement's time is its execute() plus fetching its rows (fetchone,
+    fetchmany, fetchall or iterating the cursor); it is reported once, when
+    the rows are exhausted, when the cursor is reused or closed, or when it
+    is dropped. DML is reported straight after execute with rowcount as its
+    row count.
+    """
+
+    _pending = None  # [sql, parameters, seconds, rows, many]
+
+    def _run(self, method, sql, parameters, many):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            method(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, time.perf_counter() - started, 0, many]
+        if self.description is None:
+            self._pending[3] = self.rowcount
+            self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, False)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, True)
+
+    def _fetched(self, started, rows, done):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += rows
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:  # e.g. connection already closed at shutdown
+            pass
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        conn = self.connection
+        for hook in conn.pool.statement_hooks:
+            hook(conn, *pending)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that is returned to the pool instead of closed.
+
+    Routes keep calling conn.close() as before; for a pooled connection that
+    only rolls back whatever the caller left uncommitted so the next user of
+    the thread's connection starts clean.
+    """
+
+    pool = None
+
+    def execute(self, sql, parameters=()):
+        if self.pool is None or not self.pool.statement_hooks:
+            return super().execute(sql, parameters)
+        return self.cursor(TimedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.pool is None or not self.pool.statement_hooks:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor(TimedCursor).executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    """One tuned, long-lived SQLite connection per worker thread."""
+
+    def __init__(self, db_path, pragmas=None, statement_cache_size=STATEMENT_CACHE_SIZE):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self.statement_cache_size = statement_cache_size
+        self.setup_hooks = []
+        self.statement_hooks = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._pid = os.getpid()
+        self._stats = {'opened': 0, 'closed': 0, 'checkouts': 0, 'reuses': 0, 'rollbacks': 0}
+
+    def on_connect(self, func):
+        """Register func(conn) to run on every new connection (UDFs etc.)."""
+        self.setup_hooks.append(func)
+        return func
+
+    def on_statement(self, func):
+        """Register func(conn, sql, parameters, seconds, rows, many) to run
+        after every statement on a pooled connection (see TimedCursor)."""
+        self.statement_hooks.append(func)
+        return func
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _check_fork(self):
+        # Connections must never cross a fork (gunicorn --preload): drop
+        # whatever the parent opened and let each child open its own.
+        pid = os.getpid()
+        if pid != self._pid:
+            with self._lock:
+                self._pid = pid
+                self._connections = {}
+                self._local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas['busy_timeout'] / 1000,
+            factory=PooledConnection,
+            cached_statements=self.statement_cache_size,
+            # Only the owning thread uses it; _prune_dead() closes it from
+            # another thread once the owner has exited.
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        for hook in self.setup_hooks:
+            hook(conn)
+        self._prune_dead()
+        with self._lock:
+            self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+            self._stats['opened'] += 1
+        return conn
+
+    def _prune_dead(self):
+        # The dev server starts a thread per request; close connections whose
+        # thread is gone so they don't pile up.
+        with self._lock:
+            dead = [ident for ident, (thread, _) in self._connections.items() if not thread.is_alive()]
+            conns = [self._connections.pop(ident)[1] for ident in dead]
+            self._stats['closed'] += len(conns)
+        for conn in conns:
+            conn.really_close()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        self._check_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        else:
+            self._count('reuses')
+        self._count('checkouts')
+        return conn
+
+    def release(self):
+        """End-of-request hook: keep the connection, drop any open transaction."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+            self._count('rollbacks')
+
+    def close_thread_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+            self._stats['closed'] += 1
+        conn.really_close()
+
+    def close_all(self):
+        """Close every connection (only safe when no requests are running)."""
+        with self._lock:
+            conns = [conn for _, conn in self._connections.values()]
+            self._connections = {}
+            self._stats['closed'] += len(conns)
+            self._local = threading.local()
+        for conn in conns:
+            conn.really_close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._connections)
+        stats['pid'] = self._pid
+        stats['db_path'] = self.db_path
+        stats['statement_cache_size'] = self.statement_cache_size
+        stats['pragmas'] = dict(self.pragmas)
+        stats['timestamp'] = time.time()
+        return stats
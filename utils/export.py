@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+
+from utils.query_plans import hot_query
+
+# Streaming client export. Rows are pulled from a cursor in chunks and only
+# the requested columns are pulled out of extra_data (by SQLite's JSON1, in C),
+# so memory stays flat no matter how many clients are exported.
+
+BASE_COLUMNS = ['id', 'business_name', 'location', 'phone', 'anydesk', 'source_file', 'created_at']
+CHUNK_SIZE = 2000
+
+_VALID_OBJECT = "json_valid(extra_data) AND json_type(extra_data) = 'object'"
+
+
+def _where(location):
+    if location:
+        return ' WHERE location = ?', [location]
+    return '', []
+
+
+def json_path(key):
+    """JSON1 path for a top-level key, or None if it can't be expressed as one"""
+    if '"' in key:
+        return None
+    return f'$."{key}"'
+
+
+def keys_query(location=None):
+    """(sql, params) listing the extra_data keys of every client (in one city)"""
+    where, params = _where(location)
+    extra_filter = (' AND ' if where else ' WHERE ') + _VALID_OBJECT
+    return f'''
+        SELECT j.key FROM clients, json_each(clients.extra_data) AS j
+        {where}{extra_filter}
+        GROUP BY j.key
+        ORDER BY MAX(clients.id) DESC, MIN(j.id)
+    ''', params
+
+
+# Every stored key of the whole table is the answer, so that one scans
+hot_query('export_columns', *keys_query(), scan_ok=True)
+hot_query('export_columns_by_location', *keys_query('x'))
+
+
+def available_columns(conn, location=None):
+    """Every column an export could contain: base columns, then extra_data keys
+    in order of first appearance (newest client first, like the export rows)."""
+    where, params = _where(location)
+    keys = conn.execute(*keys_query(location)).fetchall()
+    has_rows = conn.execute(f'SELECT 1 FROM clients{where} LIMIT 1', params).fetchone()
+    columns = list(BASE_COLUMNS) if has_rows else []
+    columns += [key for (key,) in keys if key not in BASE_COLUMNS]
+    return columns
+
+
+def resolve_columns(conn, selected, location=None):
+    """Requested columns that exist, in request order; all columns if none requested"""
+    columns = available_columns(conn, location)
+    if not selected:
+        return columns
+    present = set(columns)
+    return [col for col in selected if col in present]
+
+
+def rows_query(paths, python_keys, location=None):
+    """(sql, params) for iter_export_rows: the base columns, a JSON array of
+    the values at paths ([(column, path)]) and extra_data if python_keys"""
+    select = ', '.join(BASE_COLUMNS)
+    params = []
+    if len(paths) == 1:
+        select += f', CASE WHEN {_VALID_OBJECT} THEN json_array(json_extract(extra_data, ?)) END'
+        params.append(paths[0][1])
+    elif paths:
+        placeholders = ', '.join('?' for _ in paths)
+        select += f', CASE WHEN {_VALID_OBJECT} THEN json_extract(extra_data, {placeholders}) END'
+        params += [path for _, path in paths]
+    else:
+        select += ', NULL'
+    select += ', extra_data' if python_keys else ', NULL'
+
+    where, where_params = _where(location)
+    return f'SELECT {select} FROM clients{where} ORDER BY id DESC', params + where_params
+
+
+hot_query('export_by_location', *rows_query([('Category', json_path('Category'))], [], 'x'))
+
+
+def iter_export_rows(conn, columns, location=None, chunk_size=CHUNK_SIZE):
+    """Yield one list of values per client, in `columns` order.
+
+    A key in extra_data wins over the base column of the same name, as the
+    old dict-merging export did. Keys that can't be written as a JSON path
+    fall back to parsing that row's extra_data in Python.
+    """
+    paths = []
+    python_keys = []
+    for col in columns:
+        path = json_path(col)
+        if path is None:
+            python_keys.append(col)
+        else:
+            paths.append((col, path))
+
+    cursor = conn.execute(*rows_query(paths, python_keys, location))
+    base_count = len(BASE_COLUMNS)
+    path_index = {col: i for i, (col, _) in enumerate(paths)}
+
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        for row in chunk:
+            extracted = json.loads(row[base_count]) if row[base_count] else None
+            parsed = None
+            if python_keys and row[base_count + 1]:
+                try:
+                    parsed = json.loads(row[base_count + 1])
+                except ValueError:
+                    parsed = None
+                if not isinstance(parsed, dict):
+                    parsed = None
+            values = []
+            for col in columns:
+                if col in path_index:
+                    value = extracted[path_index[col]] if extracted else None
+                elif parsed is not None:
+                    value = parsed.get(col)
+                else:
+                    value = None
+                if value is None and col in BASE_COLUMNS:
+                    value = row[BASE_COLUMNS.index(col)]
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, ensure_ascii=False)
+                values.append(value)
+            yield values
+
+
+def stream_csv(columns, rows, rows_per_chunk=500):
+    """CSV text in chunks (with a BOM so Excel detects UTF-8)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    pending = 0
+    for values in rows:
+        writer.writerow(['' if v is None else v for v in values])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def write_xlsx(columns, rows, fileobj, sheet_name='Clients'):
+    """Write rows with openpyxl's write-only (constant memory) workbook"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    for values in rows:
+        sheet.append(values)
+    workbook.save(fileobj)
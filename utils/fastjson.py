@@ -0,0 +1,105 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+# JSON encoding for responses. orjson (Rust, several times faster than the
+# stdlib encoder and returning bytes directly) is used when it is installed;
+# without it everything falls back to Flask's stdlib provider. Dates,
+# decimals and dataclasses still go through Flask's _default, so responses
+# carry the same values either way; orjson writes non-ASCII text as UTF-8
+# rather than \u escapes, and NaN as null.
+#
+# iter_json_array(), iter_json_envelope() and iter_ndjson() stream a large
+# list of rows as a JSON array, as an array inside an object, or as
+# newline-delimited JSON, a batch of rows per chunk. With encoded=True the
+# rows are already JSON text (str or bytes, e.g. built by SQLite, see
+# utils/client_json.py) and are written out as they are.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+STREAM_BATCH = 500
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+else:
+    def dumps_bytes(obj):
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b'\n', mimetype=self.mimetype)
+
+    def _encode(self, obj):
+        option = _OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+
+def _fragment(item):
+    return item if isinstance(item, bytes) else item.encode()
+
+
+def _batched(items, batch, encoded=False):
+    encode = _fragment if encoded else dumps_bytes
+    chunk = []
+    for item in items:
+        chunk.append(encode(item))
+        if len(chunk) >= batch:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _array(items, batch, encoded):
+    yield b'['
+    first = True
+    for chunk in _batched(items, batch, encoded):
+        yield (b'' if first else b',') + b','.join(chunk)
+        first = False
+    yield b']'
+
+
+def iter_json_array(items, batch=STREAM_BATCH, encoded=False):
+    """Yield bytes forming one JSON array of items"""
+    yield from _array(items, batch, encoded)
+    yield b'\n'
+
+
+def iter_json_envelope(head, key, items, tail=None, batch=STREAM_BATCH, encoded=False):
+    """Yield {**head, key: [items], **tail()} as bytes. tail is called once
+    the items are exhausted, so it can describe them (counts, cursors)."""
+    yield dumps_bytes(head)[:-1] + (b',' if head else b'') + dumps_bytes(key) + b':'
+    yield from _array(items, batch, encoded)
+    extra = tail() if tail else None
+    yield (b',' + dumps_bytes(extra)[1:] if extra else b'}') + b'\n'
+
+
+def iter_ndjson(items, trailer=None, batch=STREAM_BATCH, encoded=False):
+    """Yield bytes with one JSON document per line, then trailer() if given"""
+    for chunk in _batched(items, batch, encoded):
+        yield b'\n'.join(chunk) + b'\n'
+    if trailer:
+        yield dumps_bytes(trailer()) + b'\n'
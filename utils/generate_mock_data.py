@@ -1,24 +1,148 @@
-import pandas as pd
+"""Synthetic client sheets for demos and benchmarks.
+
+    python -m utils.generate_mock_data --rows 100000 --out mock_clients.csv
+    python -m utils.generate_mock_data --rows 5000 --out mock_clients_hebrew.xlsx
+
+Rows look like supplier exports: Hebrew and English business names and
+cities, phone numbers in every format suppliers send (+972, dashes, spaces,
+landlines, 'אין', blanks), AnyDesk ids with and without spaces, and a
+header row drawn from the keyword variants map_columns() has to recognise
+(utils/ingest.py), padded and in shuffled order. Some businesses repeat, so
+detail views have records to merge. Output is written row by row (CSV, or
+openpyxl's write-only mode for .xlsx), so millions of rows use flat memory.
+The same seed always produces the same file.
+"""
+import argparse
+import csv
+import os
 import random
 
-def generate_mock_data():
-    cities = ['תל אביב', 'חיפה', 'ירושלים', 'ראשון לציון', 'אילת', 'New York', 'London']
-    categories = ['Cafe', 'Restaurant', 'Retail', 'Supermarket', 'Bar']
-    
-    data = []
-    for i in range(50):
-        city = random.choice(cities)
-        data.append({
-            'Business Name': f'Business {i+1} {random.choice(categories)}',
-            'עיר כתובת או מקום העלסק': city,
-            'Phone': f'05{random.randint(0,9)}-{random.randint(1000000, 9999999)}',
-            'AnyDesk': f'{random.randint(100, 999)} {random.randint(100, 999)} {random.randint(100, 999)}',
-            'Category': random.choice(categories)
-        })
-    
-    df = pd.DataFrame(data)
-    df.to_excel('/Users/basharmawase/Nexsis/mock_clients_hebrew.xlsx', index=False)
-    print("Mock data created: mock_clients_hebrew.xlsx")
-
-if __name__ == "__main__":
-    generate_mock_data()
+CITIES = [
+    'תל אביב', 'חיפה', 'ירושלים', 'ראשון לציון', 'אילת', 'נצרת', 'באר שבע',
+    'באקה', 'באקה אל גרבייה', ' באקה אל-גרבייה ', 'New York', 'London', 'Haifa',
+]
+CATEGORIES = ['Cafe', 'Restaurant', 'Retail', 'Supermarket', 'Bar', 'מסעדה', 'מכולת', 'קונדיטוריה']
+NAME_WORDS = ['הגליל', 'השרון', 'Golden', 'Star', 'הים', 'Cohen', 'לוי', 'Market', 'הכרמל', 'Plus']
+CONTACTS = ['משה', 'David', 'שרה', 'Noa', 'יוסי', 'Ahmad', 'רונית']
+
+# Header variants per target column; every one is picked up by map_columns()
+HEADERS = {
+    'business_name': ['שם העסק', 'שם עסק', 'Business Name', 'company', ' לקוח '],
+    'location': ['עיר', 'City', 'עיר כתובת או מקום העסק', 'יישוב', ' כתובת '],
+    'phone': ['טלפון', 'Phone', 'טלפון נייד', 'Mobile ', 'פלאפון'],
+    'anydesk': ['AnyDesk', 'anydesk id', 'אנידסק'],
+}
+EXTRA_COLUMNS = ['Category', 'איש קשר', 'הערות', 'מסגרת אשראי', 'Last Order Date']
+
+
+def phone_number(rng):
+    """A phone number in one of the formats seen in real sheets"""
+    roll = rng.random()
+    if roll < 0.05:
+        return None
+    if roll < 0.08:
+        return 'אין'
+    prefix, number = f'05{rng.randint(0, 9)}', f'{rng.randint(1000000, 9999999)}'
+    if roll < 0.15:
+        prefix = f'0{rng.choice([2, 3, 4, 8, 9])}'
+    style = rng.randrange(6)
+    if style == 0:
+        return f'{prefix}-{number}'
+    if style == 1:
+        return f'{prefix}{number}'
+    if style == 2:
+        return f'+972-{prefix[1:]}-{number}'
+    if style == 3:
+        return f'972{prefix[1:]}{number}'
+    if style == 4:
+        return f'{prefix} {number[:3]} {number[3:]}'
+    return int(f'{prefix}{number}')  # a numeric cell: leading zero lost
+
+
+def anydesk_id(rng):
+    if rng.random() < 0.1:
+        return None
+    digits = f'{rng.randint(100000000, 999999999)}'
+    return f'{digits[:3]} {digits[3:6]} {digits[6:]}' if rng.random() < 0.3 else digits
+
+
+def header_row(rng):
+    """(header labels, matching field names) in a shuffled order"""
+    fields = list(HEADERS) + rng.sample(EXTRA_COLUMNS, rng.randint(2, len(EXTRA_COLUMNS)))
+    rng.shuffle(fields)
+    labels = [rng.choice(HEADERS[field]) if field in HEADERS else field for field in fields]
+    return labels, fields
+
+
+def generate_rows(rows, fields, rng, repeat=0.05):
+    """Yield `rows` lists of cell values in `fields` order.
+
+    About `repeat` of the rows reuse an earlier business name, as when a
+    supplier lists several branches or the same client twice.
+    """
+    names = []
+    for i in range(rows):
+        if names and rng.random() < repeat:
+            name = rng.choice(names)
+        else:
+            name = f'{rng.choice(NAME_WORDS)} {rng.choice(CATEGORIES)} {i + 1}'
+            if len(names) < 10000:
+                names.append(name)
+        record = {
+            'business_name': name,
+            'location': rng.choice(CITIES),
+            'phone': phone_number(rng),
+            'anydesk': anydesk_id(rng),
+            'Category': rng.choice(CATEGORIES),
+            'איש קשר': rng.choice(CONTACTS),
+            'הערות': 'לקוח ותיק' if rng.random() < 0.3 else None,
+            'מסגרת אשראי': rng.choice([None, 5000, 10000, 50000]),
+            'Last Order Date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        }
+        yield [record[field] for field in fields]
+
+
+def write_csv(path, labels, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(labels)
+        writer.writerows(rows)
+
+
+def write_xlsx(path, labels, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(labels)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def generate_file(path, rows, seed=1):
+    """Write a sheet of `rows` clients to path (.csv or .xlsx); returns the header"""
+    rng = random.Random(seed)
+    labels, fields = header_row(rng)
+    writer = write_csv if path.lower().endswith('.csv') else write_xlsx
+    writer(path, labels, generate_rows(rows, fields, rng))
+    return labels
+
+
+def generate_mock_data(path='mock_clients_hebrew.xlsx', rows=50, seed=None):
+    generate_file(path, rows, seed)
+    print(f'Mock data created: {path}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default='mock_clients_hebrew.xlsx', help='.csv or .xlsx (default: %(default)s)')
+    args = parser.parse_args(argv)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    generate_mock_data(args.out, args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,637 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from json.encoder import encode_basestring
+
+from utils.normalize import format_phone_number, normalize_city_series
+from utils.search import fold_text, digits_only
+from utils.query_plans import hot_query
+
+# Client spreadsheet ingest. Files are read in chunks (CSV via pandas'
+# chunked reader, every cell as text so no chunk infers its own dtypes; XLSX
+# via a read-only row iterator), normalized to the clients schema and
+# inserted a chunk per statement inside one transaction per file, so peak
+# memory is one chunk and a bad file leaves nothing behind.
+#
+# mode='sync' re-imports a new version of a file already loaded under the
+# same source_file: rows are matched on row_key (see row_key()), compared on
+# row_hash (of the row's extra_data) and only inserts, updates and deletes
+# are written.
+#
+# Rows remember the upload (manifest sha256, utils/uploads.py) they came
+# from, so deleting an upload removes exactly its rows. After a sync every
+# row of the file belongs to the new version.
+#
+# Multi-file uploads (ingest_files) parse and normalize each file in a worker
+# process and hand the rows back to the calling thread, which is the only
+# writer and commits files in the order they were submitted. At most one
+# file per worker is parsed ahead of the one being written.
+#
+# XLSX rows come from python-calamine when it is installed (Rust parser, an
+# order of magnitude faster) and from openpyxl's read-only mode otherwise.
+#
+# pandas and openpyxl are imported inside the functions that parse files:
+# web workers import this module for its constants and the job queue, and
+# should not pay for loading them until an import actually runs.
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # pragma: no cover - optional speedup
+    CalamineWorkbook = None
+
+CHUNK_SIZE = 5000
+
+# Parse workers for ingest_files; NEXTIS_INGEST_WORKERS=1 disables the pool.
+INGEST_WORKERS = int(os.environ.get('NEXTIS_INGEST_WORKERS', 0)) or os.cpu_count() or 1
+
+# Priority configurations: Target -> List of Keywords (High priority first)
+COLUMN_PRIORITIES = {
+    'location': ['עיר', 'city', 'ישוב', 'יישוב', 'מיקום', 'location', 'כתובת', 'address', 'מקום'],
+    'anydesk': ['anydesk', 'אנידסק'],
+    'phone': ['phone', 'mobile', 'cell', 'tel', 'טלפון', 'נייד', 'פלאפון'],
+    'business_name': ['שם עסק', 'שם העסק', 'עסק', 'business', 'company', 'name', 'שם', 'לקוח', 'client']
+}
+
+CLIENT_COLUMNS = ['business_name', 'location', 'phone', 'anydesk', 'extra_data']
+
+ROW_COLUMNS = 'business_name, location, phone, anydesk, extra_data, source_file, row_key, row_hash, upload_sha256'
+
+# New rows are staged in a temp table and moved into clients with one INSERT
+# ... SELECT per chunk: the clients_fts trigger costs about 5x more fired from
+# thousands of single-row executemany statements than from one statement.
+STAGE_SQL = f'CREATE TEMP TABLE IF NOT EXISTS ingest_rows ({ROW_COLUMNS})'
+INSERT_SQL = f'INSERT INTO temp.ingest_rows ({ROW_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+MOVE_SQL = f'INSERT INTO clients ({ROW_COLUMNS}) SELECT {ROW_COLUMNS} FROM temp.ingest_rows ORDER BY rowid'
+
+UPDATE_SQL = '''
+    UPDATE clients SET business_name = ?, location = ?, phone = ?, anydesk = ?, extra_data = ?,
+        source_file = ?, row_key = ?, row_hash = ?, upload_sha256 = ?
+    WHERE id = ?
+'''
+
+# Positions in a row (ROW_COLUMNS, frame_to_rows)
+ROW_KEY, ROW_HASH = 6, 7
+
+INGEST_MODES = ('append', 'sync')
+AUTO_KEY = 'auto:'
+
+
+class IngestError(Exception):
+    pass
+
+
+def strip_columns(columns):
+    return [col.strip() if isinstance(col, str) else col for col in columns]
+
+
+def map_columns(columns):
+    """Pick the spreadsheet column for each clients field: {column: target}"""
+    rename_map = {}
+    used_cols = set()
+
+    for target, keywords in COLUMN_PRIORITIES.items():
+        found_col = None
+        for kw in keywords:
+            for col in columns:
+                col_lower = str(col).lower()
+                if col in used_cols: continue
+
+                # Check for keyword match
+                if kw in col_lower:
+                    found_col = col
+                    break
+            if found_col: break
+
+        if found_col:
+            rename_map[found_col] = target
+            used_cols.add(found_col)
+
+    return rename_map
+
+
+def encode_json_records(df):
+    """json.dumps(row.to_dict(), ensure_ascii=False) for every row, built
+    column-wise: each key is encoded once and each column of (string) values
+    is escaped in one pass, then rows are joined.
+
+    Duplicate column labels behave like dict assignment in to_dict(): the
+    key keeps its first position and takes the last column's value.
+    """
+    import pandas as pd
+
+    positions = {}
+    keys = []
+    for i, label in enumerate(df.columns):
+        if label in positions:
+            key, _ = keys[positions[label]]
+            keys[positions[label]] = (key, i)
+            continue
+        # Let json encode the key so non-str labels (ints, floats) come out
+        # exactly as json.dumps would write them.
+        positions[label] = len(keys)
+        keys.append((json.dumps({label: ''}, ensure_ascii=False)[1:-3], i))
+
+    if not keys:
+        return pd.Series(['{}'] * len(df), index=df.index, dtype=object)
+
+    columns = [
+        [key + encode_basestring(value) for value in df.iloc[:, i].tolist()]
+        for key, i in keys
+    ]
+    return pd.Series(['{' + ', '.join(parts) + '}' for parts in zip(*columns)], index=df.index, dtype=object)
+
+
+def row_hash(extra_data):
+    return hashlib.blake2b(extra_data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _meaningful(value):
+    return value is not None and value == value and str(value).strip() not in ('', 'אין', 'nan')
+
+
+def auto_row_key(business_name, anydesk, phone):
+    """Identity of a row for sync imports: folded business name, else the
+    AnyDesk or phone digits. None when the row has none of them."""
+    if _meaningful(business_name):
+        return f"{AUTO_KEY}n:{' '.join(fold_text(business_name).split())}"
+    if _meaningful(anydesk) and digits_only(anydesk):
+        return f'{AUTO_KEY}a:{digits_only(anydesk)}'
+    if _meaningful(phone) and digits_only(phone):
+        return f'{AUTO_KEY}p:{digits_only(phone)}'
+    return None
+
+
+def column_row_key(key_column, value):
+    """Identity taken from a configured key column (its text as stored in extra_data)"""
+    return f'{key_column}={str(value).strip()}'
+
+
+def key_prefix(key_column=None):
+    return f'{key_column}=' if key_column else AUTO_KEY
+
+
+def normalize_frame(df, rename_map, key_column=None):
+    """Raw spreadsheet rows -> DataFrame with the clients columns (plus
+    row_key/row_hash; key_column picks the identity column, see row_key)"""
+    df = df.rename(columns=rename_map) if rename_map else df.copy()
+
+    # Store all data as JSON before filtering
+    df_filled = df.fillna('')
+    # Convert all columns to string to avoid serialization issues
+    df_filled = df_filled.astype(str)
+    df['extra_data'] = encode_json_records(df_filled)
+    df['row_hash'] = [row_hash(extra) for extra in df['extra_data'].tolist()]
+
+    # Fill missing columns for SQL schema
+    for col in ['location', 'anydesk', 'phone', 'business_name']:
+        if col not in df.columns:
+            df[col] = 'אין'
+
+    # Select columns including extra_data
+    df = df[CLIENT_COLUMNS + ['row_hash']].copy()
+
+    # Normalize locations and format phones
+    df['location'] = normalize_city_series(df['location'])
+    df['phone'] = df['phone'].apply(format_phone_number)
+
+    if key_column:
+        label = rename_map.get(key_column, key_column) if rename_map else key_column
+        if label not in df_filled.columns:
+            raise IngestError(f"Key column '{key_column}' not found in file")
+        values = df_filled[label]
+        if values.ndim == 2:
+            values = values.iloc[:, -1]
+        keys = [column_row_key(key_column, value) for value in values.tolist()]
+    else:
+        keys = [
+            auto_row_key(*values)
+            for values in zip(df['business_name'].tolist(), df['anydesk'].tolist(), df['phone'].tolist())
+        ]
+    df['row_key'] = [key or f'{key_prefix(key_column)}h:{h}' for key, h in zip(keys, df['row_hash'].tolist())]
+
+    return df
+
+
+def unique_header(row):
+    """Header row -> column names the way pandas names them (blanks, duplicates)"""
+    names = []
+    seen = {}
+    for i, value in enumerate(row):
+        name = f'Unnamed: {i}' if value is None or (isinstance(value, str) and not value.strip()) else value
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _calamine_value(value):
+    # Match what openpyxl/pandas produce: blanks are missing, whole numbers are ints
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_xlsx_rows(file_path):
+    """Yield the first sheet's rows as tuples of cell values (header first)"""
+    if CalamineWorkbook is not None:
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        for row in sheet.iter_rows():
+            yield tuple(_calamine_value(value) for value in row)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_xlsx_frames(file_path, chunk_size):
+    import pandas as pd
+
+    rows = _iter_xlsx_rows(file_path)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = unique_header(header)
+    width = len(columns)
+    chunk = []
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def iter_frames(file_path, chunk_size=CHUNK_SIZE):
+    """Yield the file as DataFrames of at most chunk_size rows"""
+    try:
+        yield from _iter_frames(file_path, chunk_size)
+    except Exception as e:
+        raise IngestError(f"Could not read file: {e}")
+
+
+def _iter_frames(file_path, chunk_size):
+    import pandas as pd
+
+    if file_path.endswith('.gz'):
+        # Compressed copies from the upload store (utils/uploads.py). pandas
+        # reads gzipped CSV directly; spreadsheet readers need a real file.
+        inner_path = file_path[:-3]
+        if inner_path.endswith('.csv'):
+            yield from pd.read_csv(file_path, chunksize=chunk_size, dtype=str)
+            return
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(inner_path)[1]) as tmp:
+            with gzip.open(file_path, 'rb') as source:
+                shutil.copyfileobj(source, tmp)
+            tmp.flush()
+            yield from _iter_frames(tmp.name, chunk_size)
+        return
+
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunk_size, dtype=str)
+    elif file_path.endswith('.xlsx'):
+        yield from _iter_xlsx_frames(file_path, chunk_size)
+    else:
+        # Legacy formats (.xls) have no streaming reader; slice in memory.
+        df = pd.read_excel(file_path)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def iter_client_chunks(file_path, chunk_size=CHUNK_SIZE, key_column=None):
+    """Yield normalized clients DataFrames, one per chunk of the file"""
+    rename_map = None
+    for df in iter_frames(file_path, chunk_size):
+        df.columns = strip_columns(df.columns)
+        if rename_map is None:
+            rename_map = map_columns(df.columns)
+        yield normalize_frame(df, rename_map, key_column)
+
+
+def frame_to_rows(df, source_file, upload=None):
+    """DataFrame -> plain Python tuples for executemany (ROW_COLUMNS order).
+
+    tolist() turns numpy scalars into Python ones; NaN binds as NULL.
+    """
+    columns = [df[col].tolist() for col in CLIENT_COLUMNS]
+    columns += [[source_file] * len(df), df['row_key'].tolist(), df['row_hash'].tolist(), [upload] * len(df)]
+    return list(zip(*columns))
+
+
+def _insert_rows(conn, rows):
+    if not rows:
+        return
+    conn.execute(STAGE_SQL)
+    conn.executemany(INSERT_SQL, rows)
+    conn.execute(MOVE_SQL)
+    conn.execute('DELETE FROM temp.ingest_rows')
+
+
+def _append_rows(conn, chunks, on_progress=None):
+    rows = 0
+    for chunk in chunks:
+        _insert_rows(conn, chunk)
+        rows += len(chunk)
+        if on_progress:
+            on_progress(rows)
+    return {'rows': rows}
+
+
+EXISTING_KEYS_SQL = hot_query('sync_existing_keys',
+                              'SELECT id, row_key, row_hash FROM clients WHERE source_file = ? ORDER BY id', ('x',))
+
+
+def existing_row_keys(conn, source_file, key_column=None):
+    """{row_key: deque([(id, row_hash), ...])} for the rows already imported
+    from source_file, oldest first, plus the ids whose stored key/hash had to
+    be recomputed (rows imported before row keys, or under another key)."""
+    prefix = key_prefix(key_column)
+    existing = {}
+    stale = []
+    for client_id, key, hashed in conn.execute(EXISTING_KEYS_SQL, (source_file,)):
+        if key is None or hashed is None or not key.startswith(prefix):
+            stale.append(client_id)
+            key = None
+        existing.setdefault(key, deque()).append((client_id, hashed))
+
+    recomputed = {}
+    for start in range(0, len(stale), 500):
+        ids = stale[start:start + 500]
+        for client_id, business_name, anydesk, phone, extra_data in conn.execute(
+            f"SELECT id, business_name, anydesk, phone, extra_data FROM clients "
+            f"WHERE id IN ({', '.join('?' for _ in ids)})", ids
+        ):
+            hashed = row_hash(extra_data or '')
+            if key_column:
+                try:
+                    extra = json.loads(extra_data) if extra_data else {}
+                except ValueError:
+                    extra = {}
+                value = extra.get(key_column) if isinstance(extra, dict) else None
+                key = column_row_key(key_column, value) if value is not None else None
+            else:
+                key = auto_row_key(business_name, anydesk, phone)
+            recomputed[client_id] = (key or f'{prefix}h:{hashed}', hashed)
+
+    if recomputed:
+        for client_id, _ in existing.pop(None):
+            key, hashed = recomputed[client_id]
+            existing.setdefault(key, deque()).append((client_id, hashed))
+    return existing, set(recomputed)
+
+
+def _sync_rows(conn, chunks, source_file, key_column=None, on_progress=None, upload=None):
+    existing, stale = existing_row_keys(conn, source_file, key_column)
+    diff = {'rows': 0, 'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    for chunk in chunks:
+        inserts, updates, rekeys = [], [], []
+        for row in chunk:
+            key, hashed = row[ROW_KEY], row[ROW_HASH]
+            matches = existing.get(key)
+            if not matches:
+                inserts.append(row)
+                continue
+            client_id, stored_hash = matches.popleft()
+            if stored_hash != hashed:
+                updates.append(row + (client_id,))
+            elif client_id in stale:
+                # Same content: only store the key so the next sync can skip it
+                rekeys.append((key, hashed, client_id))
+        _insert_rows(conn, inserts)
+        conn.executemany(UPDATE_SQL, updates)
+        conn.executemany('UPDATE clients SET row_key = ?, row_hash = ? WHERE id = ?', rekeys)
+        diff['rows'] += len(chunk)
+        diff['inserted'] += len(inserts)
+        diff['updated'] += len(updates)
+        diff['unchanged'] += len(chunk) - len(inserts) - len(updates)
+        if on_progress:
+            on_progress(diff['rows'])
+
+    # Whatever wasn't matched is gone from the new version of the file
+    removed = [(client_id,) for matches in existing.values() for client_id, _ in matches]
+    conn.executemany('DELETE FROM clients WHERE id = ?', removed)
+    diff['deleted'] = len(removed)
+    # Unchanged rows now belong to this version too; upload_sha256 is not a
+    # column the version, search or profile triggers watch, so this changes
+    # no ETag or cache entry
+    conn.execute('UPDATE clients SET upload_sha256 = ? WHERE source_file = ? AND upload_sha256 IS NOT ?',
+                 (upload, source_file, upload))
+    return diff
+
+
+def _write_chunks(conn, chunks, on_progress=None, before_commit=None, mode='append',
+                  source_file=None, key_column=None, upload=None):
+    """Write every chunk of rows in one transaction; returns the counts dict
+    ({'rows'}, plus inserted/updated/deleted/unchanged for mode='sync').
+
+    before_commit(counts) runs inside the transaction, so anything it writes
+    through conn is committed (or rolled back) together with the rows.
+    """
+    if mode not in INGEST_MODES:
+        raise IngestError(f'Unknown import mode: {mode}')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if mode == 'sync':
+            counts = _sync_rows(conn, chunks, source_file, key_column, on_progress, upload)
+        else:
+            counts = _append_rows(conn, chunks, on_progress)
+        if before_commit:
+            before_commit(counts)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        if isinstance(e, IngestError):
+            raise
+        raise IngestError(str(e)) from e
+    return counts
+
+
+def _outcome(counts, seconds):
+    return {
+        **counts,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(counts['rows'] / seconds) if seconds > 0 else counts['rows'],
+    }
+
+
+def ingest_file(conn, file_path, source_file, chunk_size=CHUNK_SIZE, on_progress=None,
+                mode='append', key_column=None, upload=None):
+    """Import one spreadsheet into clients in a single transaction.
+
+    mode='append' inserts every row; mode='sync' replaces the rows previously
+    imported from source_file, writing only what changed. Returns {'rows',
+    'seconds', 'rows_per_second'} (plus the diff counts when syncing); raises
+    IngestError after rolling back if anything in the file fails. upload is
+    the manifest sha256 stored on the rows.
+    """
+    started = time.perf_counter()
+    chunks = (frame_to_rows(df, source_file, upload) for df in iter_client_chunks(file_path, chunk_size, key_column))
+    counts = _write_chunks(conn, chunks, on_progress, mode=mode, source_file=source_file, key_column=key_column,
+                           upload=upload)
+    return _outcome(counts, time.perf_counter() - started)
+
+
+def parse_file(file_path, source_file, chunk_size=CHUNK_SIZE, key_column=None, upload=None):
+    """Read and normalize a whole file into executemany-ready row chunks.
+
+    Runs in a pool worker, so it only touches the file, never the database.
+    """
+    try:
+        return [frame_to_rows(df, source_file, upload)
+                for df in iter_client_chunks(file_path, chunk_size, key_column)]
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(str(e)) from e
+
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _reset_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
+
+
+def _discard_executor(executor):
+    # Drop a pool whose worker died, unless another thread already replaced it
+    with _executor_lock:
+        if _executor is executor:
+            _reset_executor()
+
+
+def _get_executor(workers):
+    # One long-lived pool per process: spawning workers (and importing pandas
+    # in each) costs more than a typical upload. 'spawn' because the web
+    # server is threaded and fork() would copy its locks mid-use.
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers < workers:
+            _reset_executor()
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def ingest_files(conn, files, workers=None, chunk_size=CHUNK_SIZE, record=None, on_progress=None,
+                 mode='append', key_column=None):
+    """Import several spreadsheets: parse in parallel, write one at a time.
+
+    files is a list of (file_path, source_file[, upload]). Each file is still its own
+    transaction, committed in submission order by the calling thread. Returns
+    one outcome per file, in order: ingest_file's dict, or {'rows': 0,
+    'error': ...} for a file that failed. mode and key_column are passed
+    on to every file (see ingest_file).
+
+    record(index, outcome) is called once per file: inside its transaction
+    just before the commit when it succeeded, after the rollback when it
+    failed. on_progress(index, rows_parsed, rows_inserted) reports progress
+    within the file being processed.
+    """
+    files = [tuple(f) if len(f) == 3 else (*f, None) for f in files]
+    workers = min(workers or INGEST_WORKERS, len(files))
+
+    def write(index, chunks, started, parsed=None):
+        outcome = {}
+        _, source_file, upload = files[index]
+
+        def progress(rows):
+            if on_progress:
+                on_progress(index, parsed if parsed is not None else rows, rows)
+
+        def finish(counts):
+            outcome.update(_outcome(counts, time.perf_counter() - started))
+            if record:
+                record(index, outcome)
+
+        try:
+            _write_chunks(conn, chunks, progress, finish, mode, source_file, key_column, upload)
+        except IngestError as e:
+            return failed(index, e)
+        return outcome
+
+    def failed(index, error):
+        outcome = {'rows': 0, 'error': str(error)}
+        if record:
+            record(index, outcome)
+        return outcome
+
+    if workers <= 1:
+        results = []
+        for index, (file_path, source_file, upload) in enumerate(files):
+            chunks = (frame_to_rows(df, source_file, upload)
+                      for df in iter_client_chunks(file_path, chunk_size, key_column))
+            results.append(write(index, chunks, time.perf_counter()))
+        return results
+
+    # 'seconds' per file is submission -> commit, so it includes time spent
+    # queued behind earlier files. Only `workers` files are parsed ahead of
+    # the one being written: a parsed file comes back as all of its rows, so
+    # submitting every file up front would hold the whole upload in memory.
+    started = time.perf_counter()
+    pending = deque()
+
+    def submit(index):
+        file_path, source_file, upload = files[index]
+        executor = _get_executor(workers)
+        pending.append((executor, executor.submit(parse_file, file_path, source_file, chunk_size, key_column, upload)))
+
+    for index in range(workers):
+        submit(index)
+    results = []
+    for index in range(len(files)):
+        executor, future = pending.popleft()
+        try:
+            chunks, error = future.result(), None
+        except IngestError as e:
+            chunks, error = None, e
+        except BrokenProcessPool as e:
+            _discard_executor(executor)
+            chunks, error = None, f'Could not process file: {e}'
+        if index + workers < len(files):
+            submit(index + workers)
+        if error is not None:
+            results.append(failed(index, error))
+            continue
+        parsed = sum(len(chunk) for chunk in chunks)
+        if on_progress:
+            on_progress(index, parsed, 0)
+        results.append(write(index, chunks, started, parsed))
+        chunks = None  # don't hold this file's rows while waiting for the next
+    return results
+
+
+def process_excel(file_path):
+    """Process uploaded Excel file (whole file in memory; see ingest_file for big ones)"""
+    import pandas as pd
+
+    chunks = list(iter_client_chunks(file_path, chunk_size=10 ** 9))
+    if not chunks:
+        return pd.DataFrame(columns=CLIENT_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from utils.ingest import ingest_files
+from utils.process import pid_alive
+from utils.query_plans import hot_query
+from utils.uploads import record_import
+
+# Background ingest jobs. /api/upload saves the files, queues a row in `jobs`
+# and returns straight away; worker threads claim queued jobs and run them
+# through ingest_files(). Each finished file is recorded on the job row in the
+# same transaction as its clients rows, so a job interrupted by a restart is
+# picked up again from the first file that was not committed.
+#
+# Progress inside the file currently being written only exists in memory
+# (the rows aren't committed yet), so other processes see per-file progress.
+
+JOBS_SCHEMA = '''
+    -- status: queued -> running -> done (every file attempted, per-file
+    -- errors are in results) or failed (the job itself crashed)
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'queued',
+        files TEXT NOT NULL,
+        results TEXT NOT NULL DEFAULT '[]',
+        files_total INTEGER NOT NULL,
+        files_done INTEGER NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        worker_pid INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+'''
+
+_CLAIM_SQL = hot_query('claim_job', '''
+    UPDATE jobs SET status = 'running', worker_pid = ?, started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+    WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid LIMIT 1)
+    RETURNING id, files, files_done, options
+''', (1,))
+
+_RECORD_SQL = '''
+    UPDATE jobs SET
+        files_done = files_done + 1,
+        rows_inserted = rows_inserted + ?,
+        results = json_insert(results, '$[#]', json(?))
+    WHERE id = ?
+'''
+
+
+class JobQueue:
+    """SQLite-backed ingest queue with a few worker threads per process"""
+
+    def __init__(self, pool, workers=1, ingest_workers=None, poll_interval=2.0, on_finished=None):
+        self.pool = pool
+        self.on_finished = on_finished
+        self.workers = workers
+        self.ingest_workers = ingest_workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._live = {}
+        self._pid = None
+
+    def start(self):
+        """Start the worker threads (again after a fork; threads don't survive one)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self.recover()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'ingest-job-{i}', daemon=True).start()
+
+    def recover(self):
+        """Requeue jobs whose worker process is gone"""
+        conn = self.pool.connection()
+        # A running job owned by our own pid is left over from a previous
+        # process that happened to have the same pid.
+        stale = [
+            row[0] for row in conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'")
+            if not row[1] or row[1] == os.getpid() or not pid_alive(row[1])
+        ]
+        for job_id in stale:
+            conn.execute("UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE id = ?", (job_id,))
+        conn.commit()
+        return stale
+
+    def enqueue(self, files, **options):
+        """Queue [(file_path, source_file)] for import; returns the job id.
+
+        options (mode, key_column) are passed on to ingest_files().
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        conn = self.pool.connection()
+        conn.execute(
+            'INSERT INTO jobs (id, files, files_total, options) VALUES (?, ?, ?, ?)',
+            (job_id, json.dumps(files, ensure_ascii=False), len(files), json.dumps(options, ensure_ascii=False)),
+        )
+        conn.commit()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        """Job status dict, or None if there is no such job"""
+        conn = self.pool.connection()
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        files = json.loads(row['files'])
+        results = json.loads(row['results'])
+        for (_, name), outcome in zip(files, results):
+            outcome['file'] = name
+
+        rows_parsed = rows_inserted = row['rows_inserted']
+        live = self._live.get(job_id)
+        if live and row['status'] == 'running':
+            # Files still in flight: parsed, and inserted but not yet committed
+            for index, (parsed, inserted) in list(live.items()):
+                if index >= row['files_done']:
+                    rows_parsed += parsed
+                    rows_inserted += inserted
+
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'options': json.loads(row['options']),
+            'files_total': row['files_total'],
+            'files_done': row['files_done'],
+            'rows_parsed': rows_parsed,
+            'rows_inserted': rows_inserted,
+            'files': results,
+            'errors': [f"Error in {r['file']}: {r['error']}" for r in results if 'error' in r],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+        }
+
+    def _work(self):
+        while True:
+            self._wake.clear()
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f'Could not claim an ingest job: {e}')
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                continue
+            self._run(*job)
+
+    def _claim(self):
+        conn = self.pool.connection()
+        row = conn.execute(_CLAIM_SQL, (os.getpid(),)).fetchone()
+        conn.commit()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2], json.loads(row[3])
+
+    def _run(self, job_id, files, files_done, options):
+        conn = self.pool.connection()
+        remaining = [tuple(f) for f in files[files_done:]]
+        # Tag the rows with the upload they come from (utils/uploads.py)
+        uploads = dict(conn.execute(
+            f"SELECT stored_path, sha256 FROM uploads WHERE stored_path IN ({', '.join('?' for _ in remaining)})",
+            [file_path for file_path, _ in remaining]
+        ).fetchall()) if remaining else {}
+        remaining = [(file_path, name, uploads.get(file_path)) for file_path, name in remaining]
+        live = self._live[job_id] = {}
+
+        def on_progress(index, parsed, inserted):
+            live[files_done + index] = (parsed, inserted)
+
+        def record(index, outcome):
+            in_transaction = conn.in_transaction
+            conn.execute(_RECORD_SQL, (outcome['rows'], json.dumps(outcome), job_id))
+            record_import(conn, remaining[index][0], outcome)
+            if not in_transaction:
+                conn.commit()
+
+        try:
+            ingest_files(conn, remaining, workers=self.ingest_workers, record=record, on_progress=on_progress,
+                         **options)
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,)
+            )
+        except Exception as e:
+            conn.rollback()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (str(e), job_id),
+            )
+        finally:
+            conn.commit()
+            self._live.pop(job_id, None)
+            if self.on_finished:
+                self.on_finished(job_id)
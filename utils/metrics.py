@@ -0,0 +1,202 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from utils.process import pid_alive
+
+# Request metrics shared across gunicorn workers. Each process counts in
+# memory and, at most once per flush interval, writes its totals to
+# <metrics_dir>/<pid>.json (atomically, via rename). /metrics sums every
+# process's file into Prometheus text format. Totals of processes that have
+# exited are folded into dead.json, under a file lock, so counters never go
+# backwards when a worker is restarted.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+HISTOGRAMS = {
+    'nextis_http_request_duration_seconds': LATENCY_BUCKETS,
+    'nextis_http_response_bytes': SIZE_BUCKETS,
+    'nextis_sql_request_seconds': LATENCY_BUCKETS,
+}
+
+HELP = {
+    'nextis_http_requests_total': ('counter', 'Requests handled, by endpoint, method and status'),
+    'nextis_http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'nextis_http_response_bytes': ('histogram', 'Response body size by endpoint (sized responses only)'),
+    'nextis_sql_queries_total': ('counter', 'SQL statements executed, by endpoint'),
+    'nextis_sql_seconds_total': ('counter', 'Time spent in SQL statements, by endpoint'),
+    'nextis_sql_request_seconds': ('histogram', 'SQL time per request by endpoint'),
+    'nextis_slow_queries_total': ('counter', 'Statements over the slow-query threshold, by endpoint'),
+    'nextis_ingest_rows_inserted_total': ('counter', 'Client rows written by background imports'),
+    'nextis_ingest_files_total': ('counter', 'Files processed by background imports, by status'),
+}
+
+DEAD_FILE = 'dead.json'
+LOCK_FILE = '.lock'
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def _merge(into, data):
+    for key, value in data.get('counters', {}).items():
+        into['counters'][key] = into['counters'].get(key, 0) + value
+    for key, value in data.get('histograms', {}).items():
+        current = into['histograms'].get(key)
+        into['histograms'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+    return into
+
+
+def _empty():
+    return {'counters': {}, 'histograms': {}}
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return _empty()
+
+
+def _write(path, data):
+    # A tmp name of its own, so concurrent writers never rename each other's
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class Metrics:
+    def __init__(self, metrics_dir, flush_interval=1.0):
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self._data = _empty()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._pid = os.getpid()
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    def _check_fork(self):
+        # A forked child starts counting from zero in its own file
+        if os.getpid() != self._pid:
+            with self._lock:
+                self._pid = os.getpid()
+                self._data = _empty()
+
+    def inc(self, name, labels=None, value=1):
+        self._check_fork()
+        key = _key(name, labels or {})
+        with self._lock:
+            counters = self._data['counters']
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """Add value to histogram `name` (buckets from HISTOGRAMS)"""
+        self._check_fork()
+        buckets = HISTOGRAMS[name]
+        key = _key(name, labels or {})
+        with self._lock:
+            # Per-bucket counts (non-cumulative), then +Inf, sum and count
+            hist = self._data['histograms'].get(key)
+            if hist is None:
+                hist = self._data['histograms'][key] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(buckets)] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._check_fork()
+        # One flush at a time, so an older snapshot never replaces a newer one
+        with self._flush_lock:
+            with self._lock:
+                data = json.loads(json.dumps(self._data))
+                self._flushed_at = time.monotonic()
+            _write(os.path.join(self.metrics_dir, f'{self._pid}.json'), data)
+
+    def collect(self):
+        """Totals across every process that has written to metrics_dir"""
+        self.flush()
+        with open(os.path.join(self.metrics_dir, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead_path = os.path.join(self.metrics_dir, DEAD_FILE)
+            dead = _read(dead_path)
+            total = _merge(_empty(), dead)
+            folded = []
+            for name in os.listdir(self.metrics_dir):
+                stem, ext = os.path.splitext(name)
+                if ext != '.json' or not stem.isdigit():
+                    continue
+                path = os.path.join(self.metrics_dir, name)
+                data = _read(path)
+                _merge(total, data)
+                if not pid_alive(int(stem)):
+                    _merge(dead, data)
+                    folded.append(path)
+            if folded:
+                _write(dead_path, dead)
+                for path in folded:
+                    os.remove(path)
+        return total
+
+    def render(self):
+        """Prometheus text exposition of collect()"""
+        total = self.collect()
+        series = {}
+        for key, value in total['counters'].items():
+            name, labels = json.loads(key)
+            series.setdefault(name, []).append(f'{name}{_labels(labels)} {_number(value)}')
+        for key, hist in total['histograms'].items():
+            name, labels = json.loads(key)
+            buckets = HISTOGRAMS[name]
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), hist):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + [["le", _number(bound)]])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(hist[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {hist[-1]}')
+
+        out = []
+        for name in sorted(series):
+            kind, text = HELP.get(name, ('untyped', name))
+            out.append(f'# HELP {name} {text}')
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(series[name])
+        return '\n'.join(out) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
@@ -0,0 +1,302 @@
+import sqlite3
+from datetime import datetime
+
+from utils.normalize import format_phone_number
+from utils.search import SEARCH_SCHEMA, SEARCH_TRIGGERS, BACKFILL_SQL
+from utils.rollups import ROLLUP_SCHEMA, ROLLUP_TRIGGERS, rebuild_rollups
+from utils.jobs import JOBS_SCHEMA
+from utils.uploads import UPLOADS_SCHEMA, BACKFILL_SQL as BACKFILL_UPLOADS_SQL
+from utils.versions import version_schema, version_triggers
+from utils.profiles import PROFILE_SCHEMA, PROFILE_TRIGGERS, BACKFILL_SQL as PROFILE_BACKFILL_SQL
+
+# Versioned schema migrations. Each one runs exactly once per database and is
+# recorded in schema_version; apply_migrations() takes the write lock first so
+# several workers starting together can't apply the same step twice.
+
+MIGRATIONS = []
+PHONE_BATCH = 5000
+
+
+class Migration:
+    def __init__(self, version, name, func):
+        self.version = version
+        self.name = name
+        self.func = func
+
+    def __repr__(self):
+        return f'<Migration {self.version} {self.name}>'
+
+
+def migration(version, name):
+    """Register func(conn) as schema migration number `version`"""
+    def decorator(func):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f'Duplicate migration version {version}')
+        MIGRATIONS.append(Migration(version, name, func))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+
+def run_script(conn, script):
+    """Execute a multi-statement script inside the current transaction.
+
+    conn.executescript() would COMMIT first, which breaks the one-transaction-
+    per-migration guarantee, so statements are split and run one at a time.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            if statement.strip():
+                conn.execute(statement)
+            statement = ''
+    if statement.strip():
+        conn.execute(statement)
+
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def applied_versions(conn):
+    ensure_version_table(conn)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+
+def pending_migrations(conn):
+    done = applied_versions(conn)
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+def schema_pending(conn):
+    """Pending migrations without writing anything (startup check)"""
+    try:
+        done = {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+    except sqlite3.OperationalError:
+        done = set()
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+def apply_migrations(conn, log=print):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the list of migrations that were applied by this call.
+    """
+    if not pending_migrations(conn):
+        return []
+
+    applied = []
+    for m in MIGRATIONS:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-check under the write lock: another worker may have won.
+            if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (m.version,)).fetchone():
+                conn.rollback()
+                continue
+            started = datetime.now()
+            m.func(conn)
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (m.version, m.name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(m)
+        if log:
+            log(f'Applied migration {m.version} {m.name} in {(datetime.now() - started).total_seconds():.2f}s')
+    return applied
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+# --- Migrations -------------------------------------------------------------
+
+@migration(1, 'initial_schema')
+def _initial_schema(conn):
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS clients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            business_name TEXT,
+            location TEXT,
+            phone TEXT,
+            anydesk TEXT,
+            source_file TEXT,
+            extra_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            rating INTEGER,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            description TEXT,
+            image_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS project_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER,
+            image_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS contact_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            phone TEXT,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+
+
+@migration(2, 'clients_extra_data')
+def _clients_extra_data(conn):
+    """Databases from before the extra_data column"""
+    if not column_exists(conn, 'clients', 'extra_data'):
+        conn.execute('ALTER TABLE clients ADD COLUMN extra_data TEXT')
+
+
+@migration(3, 'format_existing_phones')
+def _format_existing_phones(conn):
+    # Walk the table in id ranges so memory stays flat on large databases,
+    # and format each distinct number once per batch.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, phone FROM clients WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, PHONE_BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        formatted = {phone: format_phone_number(phone) for phone in {row[1] for row in rows}}
+        conn.executemany('UPDATE clients SET phone = ? WHERE id = ?', [
+            (formatted[phone], client_id) for client_id, phone in rows if formatted[phone] != phone
+        ])
+        last_id = rows[-1][0]
+
+
+@migration(4, 'clients_search_index')
+def _clients_search_index(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clients_fts'"
+    ).fetchone()
+    run_script(conn, SEARCH_SCHEMA + SEARCH_TRIGGERS)
+    if not exists:
+        conn.execute(BACKFILL_SQL)
+
+
+@migration(5, 'secondary_indexes')
+def _secondary_indexes(conn):
+    run_script(conn, '''
+        CREATE INDEX IF NOT EXISTS idx_clients_location ON clients (location);
+        CREATE INDEX IF NOT EXISTS idx_clients_source_file ON clients (source_file);
+        CREATE INDEX IF NOT EXISTS idx_clients_business_name_nocase ON clients (business_name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_project_images_project_id ON project_images (project_id);
+    ''')
+    conn.execute('ANALYZE')
+
+
+@migration(6, 'analytics_rollups')
+def _analytics_rollups(conn):
+    run_script(conn, ROLLUP_SCHEMA + ROLLUP_TRIGGERS)
+    rebuild_rollups(conn)
+
+
+@migration(7, 'ingest_jobs')
+def _ingest_jobs(conn):
+    run_script(conn, JOBS_SCHEMA)
+
+
+@migration(8, 'upload_manifest')
+def _upload_manifest(conn):
+    run_script(conn, UPLOADS_SCHEMA)
+
+
+@migration(9, 'clients_row_keys')
+def _clients_row_keys(conn):
+    """Row identity + content hash for sync re-imports (utils/ingest.py)"""
+    for column in ('row_key', 'row_hash'):
+        if not column_exists(conn, 'clients', column):
+            conn.execute(f'ALTER TABLE clients ADD COLUMN {column} TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_clients_source_row_key ON clients (source_file, row_key, row_hash)')
+    if not column_exists(conn, 'jobs', 'options'):
+        conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT NOT NULL DEFAULT '{}'")
+    # Re-keying rows must not re-index them for search
+    conn.execute('DROP TRIGGER IF EXISTS clients_fts_au')
+    run_script(conn, SEARCH_TRIGGERS)
+
+
+@migration(10, 'business_profiles')
+def _business_profiles(conn):
+    run_script(conn, PROFILE_SCHEMA + PROFILE_TRIGGERS)
+    conn.execute(PROFILE_BACKFILL_SQL)
+
+
+@migration(11, 'portfolio_versions')
+def _portfolio_versions(conn):
+    run_script(conn, version_schema(['projects', 'project_images']))
+
+
+@migration(12, 'data_versions')
+def _data_versions(conn):
+    run_script(conn, version_schema(['clients', 'reviews']))
+
+
+@migration(13, 'clients_location_name_index')
+def _clients_location_name_index(conn):
+    """Keyset paging of one city by name (/api/clients?location=&sort=business_name)"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_clients_location_name "
+        "ON clients (location, ifnull(business_name, '') COLLATE NOCASE)"
+    )
+
+
+@migration(14, 'clients_upload_sha256')
+def _clients_upload_sha256(conn):
+    """Which upload each client row came from (utils/uploads.py, delete_upload)"""
+    if not column_exists(conn, 'clients', 'upload_sha256'):
+        conn.execute('ALTER TABLE clients ADD COLUMN upload_sha256 TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_clients_upload_sha256 ON clients (upload_sha256)')
+    # Rows imported earlier only have their file name; it identifies the
+    # upload when no other manifest row has the same name.
+    conn.execute(BACKFILL_UPLOADS_SQL)
+
+
+@migration(15, 'rollup_null_locations')
+def _rollup_null_locations(conn):
+    """Count NULL locations apart from '' so unique_locations leaves them out"""
+    if not column_exists(conn, 'client_counters', 'null_locations'):
+        conn.execute('ALTER TABLE client_counters ADD COLUMN null_locations INTEGER NOT NULL DEFAULT 0')
+    conn.execute('DROP TRIGGER IF EXISTS rollup_clients_ai')
+    conn.execute('DROP TRIGGER IF EXISTS rollup_clients_ad')
+    run_script(conn, ROLLUP_TRIGGERS)
+    rebuild_rollups(conn)
+
+
+@migration(16, 'clients_version_columns')
+def _clients_version_columns(conn):
+    """Re-stamping unchanged rows on a sync import no longer changes ETags"""
+    conn.execute('DROP TRIGGER IF EXISTS version_clients_au')
+    run_script(conn, version_triggers('clients'))
@@ -0,0 +1,84 @@
+# The scalar functions run on request paths and in migrations, so this module
+# keeps pandas/numpy out of its imports; the Series version below (ingest
+# only) imports them when called.
+
+
+def _is_missing(value):
+    """pd.isna() for a scalar: None, NaN, NaT and pd.NA"""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:  # pd.NA refuses to be truth-tested
+        return True
+
+
+def format_phone_number(phone):
+    """Format phone number to Israeli standard"""
+    if _is_missing(phone) or phone == 'אין':
+        return 'אין'
+    
+    # Remove non-digits
+    digits = ''.join(filter(str.isdigit, str(phone)))
+    
+    # Handle country code
+    if digits.startswith('972'):
+        digits = '0' + digits[3:]
+    
+    # Standard format: 05X-XXXXXXX
+    if len(digits) == 10 and digits.startswith('05'):
+        return f"{digits[:3]}-{digits[3:]}"
+        
+    # Landline: 0X-XXXXXXX
+    if len(digits) == 9 and digits.startswith('0'):
+        return f"{digits[:2]}-{digits[2:]}"
+        
+    return phone
+
+
+def normalize_city(city):
+    """Normalize city names"""
+    city = str(city).strip()
+    if 'באקה' in city:
+        return 'באקה אל גרבייה'
+    return city
+
+
+# --- Column-at-a-time version for ingest -------------------------------------
+# Same results as normalize_city() (tests/test_normalize.py checks this on
+# randomized input). Each distinct city is normalized once and the results
+# are broadcast back through a lookup table; supplier sheets repeat a few
+# dozen cities over every row, so this beats a per-cell apply 3-4x.
+# Phones are nearly all distinct, and the same table (or a Series.str regex
+# pipeline) measured slower than apply(format_phone_number), so ingest
+# keeps the apply for them.
+
+
+def _map_distinct(series, func):
+    import numpy as np
+    import pandas as pd
+
+    values = series.astype(object)
+    if pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        codes, uniques = pd.factorize(values)
+        table = np.array([func(value) for value in uniques], dtype=object)
+        return pd.Series(table[codes], index=series.index, dtype=object)
+
+    # Mixed types: 1, 1.0 and True hash alike but print differently, so the
+    # table is keyed on (type, value). NaN never equals itself and simply
+    # misses the table each time, which is still correct.
+    table = {}
+    result = []
+    for value in values:
+        key = (value.__class__, value)
+        try:
+            mapped = table[key]
+        except KeyError:
+            mapped = table[key] = func(value)
+        result.append(mapped)
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def normalize_city_series(cities):
+    """normalize_city() for a whole Series"""
+    return _map_distinct(cities, normalize_city)
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Statistical profiler for single requests. While a request is profiled a
+# sampler thread wakes every `interval` seconds and records the request
+# thread's Python stack; nothing is hooked into the interpreter, so the
+# profiled request runs at close to full speed and other requests not at all.
+# Stacks are stored in collapsed format ("outer;inner;leaf count" per line),
+# which flamegraph.pl and https://www.speedscope.app open directly, next to
+# a small JSON file describing the request.
+
+DEFAULT_INTERVAL = 0.005
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse(frame, labels):
+    """'outer;...;leaf' for a frame, with code object labels cached in labels"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        label = labels.get(code)
+        if label is None:
+            label = labels[code] = frame_label(code)
+        parts.append(label)
+        frame = frame.f_back
+    parts.reverse()
+    return ';'.join(parts)
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = self.stopped = None
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='nextis-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; returns the Counter of collapsed stacks"""
+        if self._thread is not None and self.stopped is None:
+            self._stop.set()
+            self._thread.join()
+            self.stopped = time.perf_counter()
+        return self.stacks
+
+    @property
+    def seconds(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[collapse(frame, self._labels)] += 1
+            self.samples += 1
+            del frame
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', text or 'request')[:60]
+
+
+def profile_name(endpoint):
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(endpoint)}-{uuid.uuid4().hex[:8]}"
+
+
+def save_profile(profile_dir, name, profiler, meta, keep=200):
+    """Stop profiler and write its stacks and meta to profile_dir as `name`"""
+    profiler.stop()
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, name)
+    with open(f'{base}.collapsed', 'w', encoding='utf-8') as f:
+        for stack, count in profiler.stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    meta = dict(meta, name=name, samples=profiler.samples, interval=profiler.interval,
+                seconds=round(profiler.seconds, 4), created=time.time(), pid=os.getpid())
+    with open(f'{base}.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    prune_profiles(profile_dir, keep)
+
+
+def list_profiles(profile_dir):
+    """Metadata of stored profiles, newest first"""
+    profiles = []
+    try:
+        names = os.listdir(profile_dir)
+    except OSError:
+        return []
+    for filename in names:
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(profile_dir, filename), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda p: p.get('created', 0), reverse=True)
+    return profiles
+
+
+def profile_path(profile_dir, name):
+    """Path of a stored collapsed-stack file, or None for unknown/unsafe names"""
+    if not re.fullmatch(r'[A-Za-z0-9_.-]+', name):
+        return None
+    path = os.path.join(profile_dir, f'{name}.collapsed')
+    return path if os.path.exists(path) else None
+
+
+def prune_profiles(profile_dir, keep):
+    for meta in list_profiles(profile_dir)[keep:]:
+        for ext in ('.collapsed', '.json'):
+            try:
+                os.remove(os.path.join(profile_dir, meta['name'] + ext))
+            except OSError:
+                pass
@@ -0,0 +1,145 @@
+import json
+import math
+import sqlite3
+
+from utils.query_plans import hot_query
+
+# Merged per-business view behind /api/clients/details. Every client row with
+# the same business_name (case-insensitive, like the old COLLATE NOCASE query)
+# contributes to one profile. Triggers bump the profile's version whenever a
+# row for that business is written; the merged Field/Value JSON is rebuilt on
+# the next read of a stale profile and stored, so repeated clicks are a
+# single keyed read.
+
+PROFILE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS business_profiles (
+        name TEXT PRIMARY KEY COLLATE NOCASE,
+        version INTEGER NOT NULL DEFAULT 1,
+        computed_version INTEGER NOT NULL DEFAULT 0,
+        profile TEXT
+    );
+'''
+
+_TOUCH = '''
+        INSERT INTO business_profiles (name) VALUES ({r}.business_name)
+            ON CONFLICT (name) DO UPDATE SET version = version + 1;
+'''
+
+PROFILE_TRIGGERS = f'''
+    CREATE TRIGGER IF NOT EXISTS profiles_clients_ai AFTER INSERT ON clients
+    WHEN new.business_name IS NOT NULL BEGIN
+        {_TOUCH.format(r='new')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS profiles_clients_ad AFTER DELETE ON clients
+    WHEN old.business_name IS NOT NULL BEGIN
+        {_TOUCH.format(r='old')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS profiles_clients_au
+    AFTER UPDATE OF business_name, location, phone, anydesk, extra_data, source_file ON clients BEGIN
+        INSERT INTO business_profiles (name) SELECT old.business_name WHERE old.business_name IS NOT NULL
+            ON CONFLICT (name) DO UPDATE SET version = version + 1;
+        INSERT INTO business_profiles (name) SELECT new.business_name WHERE new.business_name IS NOT NULL
+            ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END;
+'''
+
+# Every existing business starts stale and is built on first read.
+BACKFILL_SQL = '''
+    INSERT INTO business_profiles (name)
+    SELECT business_name FROM clients WHERE business_name IS NOT NULL
+    GROUP BY business_name COLLATE NOCASE
+    ON CONFLICT (name) DO NOTHING
+'''
+
+CORE_FIELDS = ['location', 'phone', 'anydesk', 'business_name']
+
+
+def _display(value):
+    # What the old pandas transpose + fillna('') produced for missing values
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return value
+
+
+def merge_profile(business_name, records):
+    """Field/Value rows for one business from its client records (oldest
+    first): later records win, extra_data wins over the core columns."""
+    merged_data = {}
+    source_files = set()
+    for record in records:
+        row_data = {}
+        if record['extra_data']:
+            try:
+                row_data = json.loads(record['extra_data'])
+            except ValueError:
+                pass
+            if not isinstance(row_data, dict):
+                row_data = {}
+
+        for field in CORE_FIELDS:
+            val = record[field]
+            if val and val != 'אין' and field not in row_data:
+                row_data[field] = val
+
+        merged_data.update(row_data)
+        if record['source_file']:
+            source_files.add(record['source_file'])
+
+    merged_data['business_name'] = business_name
+    if source_files:
+        merged_data['source_file'] = ', '.join(sorted(source_files))
+
+    return [{'Field': key, 'Value': _display(value)} for key, value in merged_data.items()]
+
+
+PROFILE_RECORDS_SQL = hot_query('client_details', '''
+    SELECT business_name, location, phone, anydesk, extra_data, source_file
+    FROM clients WHERE business_name = ? COLLATE NOCASE ORDER BY id
+''', ('x',))
+
+
+def build_profile(conn, business_name):
+    records = conn.execute(PROFILE_RECORDS_SQL, (business_name,)).fetchall()
+    return json.dumps(merge_profile(business_name, records), ensure_ascii=False)
+
+
+def _store(conn, name, version, profile):
+    # Best effort: if a write happened meanwhile (version moved on) the row
+    # stays stale, and if an import holds the write lock we don't wait for it.
+    busy_timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+    conn.execute('PRAGMA busy_timeout = 0')
+    try:
+        conn.execute('''
+            UPDATE business_profiles SET profile = ?, computed_version = ?
+            WHERE name = ? AND version = ?
+        ''', (profile, version, name, version))
+        conn.commit()
+    except sqlite3.OperationalError:
+        conn.rollback()
+    finally:
+        conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+
+
+CLIENT_PROFILE_SQL = hot_query('client_profile', '''
+    SELECT clients.business_name, p.name, p.version, p.computed_version, p.profile
+    FROM clients LEFT JOIN business_profiles AS p ON p.name = clients.business_name
+    WHERE clients.id = ?
+''', (1,))
+
+
+def client_profile(conn, client_id):
+    """Merged profile JSON (text) for the business of client_id, or None if
+    there is no such client."""
+    row = conn.execute(CLIENT_PROFILE_SQL, (client_id,)).fetchone()
+    if row is None:
+        return None
+    business_name, name, version, computed_version, profile = row
+    # The stored profile carries the first-seen spelling of the name; a row
+    # spelled with different case gets its own (uncached) view.
+    if profile is not None and version == computed_version and name == business_name:
+        return profile
+
+    profile = build_profile(conn, business_name)
+    if name == business_name:
+        _store(conn, name, version, profile)
+    return profile
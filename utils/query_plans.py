@@ -0,0 +1,35 @@
+# Hot-query plan checks for `python manage.py explain`. Each module registers
+# the statements it runs with hot_query(), next to the code that runs them
+# (and through the same constant or builder), so the checked SQL cannot drift
+# from what the app executes.
+
+# (name, sql, sample params, scan allowed). A scan is only acceptable where
+# the endpoint returns the whole table anyway.
+HOT_QUERIES = []
+
+
+def hot_query(name, sql, params=(), scan_ok=False):
+    """Register sql (with sample params) for plan checks; returns sql"""
+    HOT_QUERIES.append((name, sql, tuple(params), scan_ok))
+    return sql
+
+
+def explain_query(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN detail lines for sql"""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def is_table_scan(detail):
+    # "SCAN clients_fts VIRTUAL TABLE INDEX ..." is the FTS lookup, not a scan,
+    # and "SCAN ... USING (COVERING) INDEX" still walks an index in order.
+    return detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail and 'USING' not in detail
+
+
+def explain_hot_queries(conn):
+    """[(name, sql, plan lines, has unexpected scan)] for every hot query"""
+    report = []
+    for name, sql, params, scan_ok in HOT_QUERIES:
+        plan = explain_query(conn, sql, params)
+        bad = not scan_ok and any(is_table_scan(line) for line in plan)
+        report.append((name, sql, plan, bad))
+    return report
@@ -0,0 +1,111 @@
+# Analytics rollups for get_stats(): per-location client counts plus a single
+# counters row, kept exact by triggers on clients so every write path (routes,
+# bulk ingest, manage.py) maintains them. Reading the analytics panel is then
+# a primary-key lookup and a 10-row index walk instead of a full GROUP BY.
+#
+# NULL locations are counted under '' so they can share the upsert key (the
+# top-locations list shows them as ''). null_locations counts them on their
+# own, so unique_locations can still be read as COUNT(DISTINCT location),
+# which leaves NULL out (STATS_SQL).
+
+from utils.query_plans import hot_query
+
+ROLLUP_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS location_stats (
+        location TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_location_stats_count ON location_stats (count DESC);
+    CREATE TABLE IF NOT EXISTS client_counters (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL DEFAULT 0,
+        unique_locations INTEGER NOT NULL DEFAULT 0,
+        null_locations INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO client_counters (id, total, unique_locations) VALUES (1, 0, 0);
+'''
+
+ROLLUP_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS rollup_clients_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO location_stats (location, count) VALUES (COALESCE(new.location, ''), 1)
+            ON CONFLICT (location) DO UPDATE SET count = count + 1;
+        UPDATE client_counters SET total = total + 1, null_locations = null_locations + (new.location IS NULL)
+        WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollup_clients_ad AFTER DELETE ON clients BEGIN
+        UPDATE location_stats SET count = count - 1 WHERE location = COALESCE(old.location, '');
+        DELETE FROM location_stats WHERE location = COALESCE(old.location, '') AND count <= 0;
+        UPDATE client_counters SET total = total - 1, null_locations = null_locations - (old.location IS NULL)
+        WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollup_clients_au AFTER UPDATE OF location ON clients
+    WHEN COALESCE(old.location, '') != COALESCE(new.location, '') BEGIN
+        UPDATE location_stats SET count = count - 1 WHERE location = COALESCE(old.location, '');
+        DELETE FROM location_stats WHERE location = COALESCE(old.location, '') AND count <= 0;
+        INSERT INTO location_stats (location, count) VALUES (COALESCE(new.location, ''), 1)
+            ON CONFLICT (location) DO UPDATE SET count = count + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollup_clients_au_null AFTER UPDATE OF location ON clients
+    WHEN (old.location IS NULL) != (new.location IS NULL) BEGIN
+        UPDATE client_counters SET null_locations = null_locations + (new.location IS NULL) - (old.location IS NULL)
+        WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollup_location_stats_ai AFTER INSERT ON location_stats BEGIN
+        UPDATE client_counters SET unique_locations = unique_locations + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS rollup_location_stats_ad AFTER DELETE ON location_stats BEGIN
+        UPDATE client_counters SET unique_locations = unique_locations - 1 WHERE id = 1;
+    END;
+'''
+
+# get_stats() totals: the '' row only counts as a location when it holds a
+# client whose location really is ''
+STATS_SQL = hot_query('stats_counters', '''
+    SELECT total, unique_locations - (null_locations > 0 AND null_locations = (
+        SELECT count FROM location_stats WHERE location = ''
+    )) AS unique_locations
+    FROM client_counters WHERE id = 1
+''')
+
+# What the rollups should contain, recomputed from clients the slow way.
+_EXPECTED_LOCATIONS_SQL = '''
+    SELECT COALESCE(location, '') AS location, COUNT(*) AS count
+    FROM clients GROUP BY COALESCE(location, '')
+'''
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from clients (inside the caller's transaction)"""
+    conn.execute('DELETE FROM location_stats')
+    conn.execute('INSERT INTO location_stats (location, count) ' + _EXPECTED_LOCATIONS_SQL)
+    conn.execute('''
+        UPDATE client_counters SET
+            total = (SELECT COUNT(*) FROM clients),
+            unique_locations = (SELECT COUNT(*) FROM location_stats),
+            null_locations = (SELECT COUNT(*) FROM clients WHERE location IS NULL)
+        WHERE id = 1
+    ''')
+
+
+def verify_rollups(conn):
+    """List of human-readable drift descriptions (empty when consistent)"""
+    problems = []
+    total, unique, nulls = conn.execute(
+        'SELECT total, unique_locations, null_locations FROM client_counters WHERE id = 1'
+    ).fetchone()
+    actual_total = conn.execute('SELECT COUNT(*) FROM clients').fetchone()[0]
+    if total != actual_total:
+        problems.append(f'total is {total}, clients has {actual_total} rows')
+    actual_nulls = conn.execute('SELECT COUNT(*) FROM clients WHERE location IS NULL').fetchone()[0]
+    if nulls != actual_nulls:
+        problems.append(f'null_locations is {nulls}, clients has {actual_nulls} rows without a location')
+
+    expected = {row[0]: row[1] for row in conn.execute(_EXPECTED_LOCATIONS_SQL)}
+    stored = {row[0]: row[1] for row in conn.execute('SELECT location, count FROM location_stats')}
+    if unique != len(expected):
+        problems.append(f'unique_locations is {unique}, expected {len(expected)}')
+    for location in sorted(set(expected) | set(stored)):
+        if expected.get(location, 0) != stored.get(location, 0):
+            problems.append(f'location {location!r}: stored {stored.get(location, 0)}, '
+                            f'actual {expected.get(location, 0)}')
+    return problems
@@ -0,0 +1,144 @@
+import re
+import unicodedata
+
+from utils.query_plans import hot_query
+
+# Full-text index over clients. Text is folded in Python (fts_fold) before it
+# reaches FTS5 because unicode61 treats Hebrew niqqud as separators and knows
+# nothing about final letter forms. The fold/digits functions are registered
+# on every pooled connection, so writes to clients from a plain sqlite3 shell
+# (which lacks them) will fail the triggers below.
+
+FTS_COLUMNS = ['business_name', 'location', 'phone', 'anydesk', 'extra']
+
+# bm25 weights, same order as FTS_COLUMNS: a hit in the name beats a hit in
+# some random spreadsheet column.
+BM25_WEIGHTS = (10.0, 4.0, 4.0, 4.0, 1.0)
+
+FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_NON_DIGITS = re.compile(r'\D+')
+
+SEARCH_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+        business_name, location, phone, anydesk, extra,
+        tokenize = "unicode61 remove_diacritics 2"
+    );
+'''
+
+# Row expression shared by the triggers and the backfill; {r} is new/old/clients.
+_FTS_ROW = '''
+    fts_fold({r}.business_name),
+    fts_fold({r}.location),
+    fts_fold({r}.phone) || ' ' || fts_digits({r}.phone),
+    fts_fold({r}.anydesk) || ' ' || fts_digits({r}.anydesk),
+    CASE WHEN json_valid({r}.extra_data)
+         THEN fts_fold((SELECT group_concat(value, ' ') FROM json_each({r}.extra_data)))
+         ELSE fts_fold({r}.extra_data) END
+'''
+
+SEARCH_TRIGGERS = f'''
+    CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO clients_fts (rowid, business_name, location, phone, anydesk, extra)
+        VALUES (new.id, {_FTS_ROW.format(r='new')});
+    END;
+    CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+        DELETE FROM clients_fts WHERE rowid = old.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS clients_fts_au
+    AFTER UPDATE OF business_name, location, phone, anydesk, extra_data ON clients BEGIN
+        DELETE FROM clients_fts WHERE rowid = old.id;
+        INSERT INTO clients_fts (rowid, business_name, location, phone, anydesk, extra)
+        VALUES (new.id, {_FTS_ROW.format(r='new')});
+    END;
+'''
+
+BACKFILL_SQL = f'''
+    INSERT INTO clients_fts (rowid, business_name, location, phone, anydesk, extra)
+    SELECT clients.id, {_FTS_ROW.format(r='clients')} FROM clients
+'''
+
+
+# One str.translate() pass drops combining marks (niqqud, Latin accents after
+# NFKD) and maps final letters. BMP only, which covers Hebrew and Latin.
+_FOLD_TABLE = {cp: None for cp in range(0x300, 0x10000) if unicodedata.combining(chr(cp))}
+_FOLD_TABLE.update(FINAL_LETTERS)
+
+
+def fold_text(value):
+    """Normalize text for indexing/matching: strip niqqud and diacritics,
+    map final letters to their regular forms and casefold."""
+    if value is None:
+        return ''
+    return unicodedata.normalize('NFKD', str(value)).translate(_FOLD_TABLE).casefold()
+
+
+def digits_only(value):
+    """'052-123 4567' -> '0521234567' so numbers match however they were typed"""
+    if value is None:
+        return ''
+    return _NON_DIGITS.sub('', str(value))
+
+
+def register_search_functions(conn):
+    conn.create_function('fts_fold', 1, fold_text, deterministic=True)
+    conn.create_function('fts_digits', 1, digits_only, deterministic=True)
+
+
+def rebuild_search_index(conn):
+    """Re-index every client (e.g. after changing fold_text)"""
+    conn.execute('DELETE FROM clients_fts')
+    conn.execute(BACKFILL_SQL)
+    conn.commit()
+
+
+def build_match_query(query, fields=None):
+    """Turn user input into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so partial words match while
+    typing and FTS syntax characters in the input can't break the query.
+    Returns None when nothing searchable is left.
+    """
+    tokens = TOKEN_RE.findall(fold_text(query))
+    if not tokens:
+        return None
+    expr = ' '.join(f'"{token}"*' for token in tokens)
+    columns = [f for f in (fields or []) if f in FTS_COLUMNS]
+    if columns:
+        expr = '{%s} : (%s)' % (' '.join(columns), expr)
+    return expr
+
+
+def search_sql(location=False):
+    """Ranked FTS page query; params are the MATCH expression, the city if
+    location, then LIMIT and OFFSET"""
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    where = 'clients_fts MATCH ?' + (' AND clients.location = ?' if location else '')
+    return f'''
+        SELECT clients.id, clients.business_name, clients.location, clients.phone, clients.anydesk,
+               clients.source_file, clients.extra_data, clients.created_at
+        FROM clients_fts
+        JOIN clients ON clients.id = clients_fts.rowid
+        WHERE {where}
+        ORDER BY bm25(clients_fts, {weights}), clients.id DESC
+        LIMIT ? OFFSET ?
+    '''
+
+
+hot_query('search', search_sql(), ('"x"*', 21, 0))
+hot_query('search_in_city', search_sql(location=True), ('"x"*', 'x', 21, 0))
+
+
+def search_clients(conn, query, fields=None, limit=20, offset=0, location=None):
+    """Ranked page of client rows matching query (in one city if location
+    is given).
+
+    Fetches one extra row so the caller can tell whether another page exists;
+    returns (rows, has_more).
+    """
+    match = build_match_query(query, fields)
+    if match is None:
+        return [], False
+    params = [match, location] if location else [match]
+    rows = conn.execute(search_sql(bool(location)), params + [limit + 1, offset]).fetchall()
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import threading
+import time
+
+# Structured slow-query log. The pool reports every statement (utils/db.py,
+# TimedCursor); those over the threshold are appended to a JSON-lines file
+# shared by all workers (one short O_APPEND write per entry). The first time a
+# process sees a statement its EXPLAIN QUERY PLAN is captured and logged with
+# it, so a query that has degraded into a table scan says so in the log.
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """One line, literals replaced by ?, IN lists collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def params_shape(parameters, many=False):
+    """Parameter types (never values), e.g. ['int', 'str'] or {'name': 'str'}"""
+    if many:
+        return 'many'
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    try:
+        return [type(v).__name__ for v in parameters]
+    except TypeError:
+        return type(parameters).__name__
+
+
+class SlowQueryLog:
+    def __init__(self, path, threshold_ms=100, max_bytes=10 * 1024 * 1024):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.max_bytes = max_bytes
+        self._explained = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def observe(self, conn, sql, parameters, seconds, rows, many=False, route=None):
+        """Statement hook: log sql if it took longer than the threshold"""
+        if seconds < self.threshold or getattr(self._local, 'busy', False):
+            return False
+        self._local.busy = True  # our own EXPLAIN runs through the pool too
+        try:
+            normalized = normalize_sql(sql)
+            entry = {
+                'ts': round(time.time(), 3),
+                'pid': os.getpid(),
+                'route': route,
+                'ms': round(seconds * 1000, 2),
+                'rows': rows,
+                'sql': normalized,
+                'params': params_shape(parameters, many),
+            }
+            with self._lock:
+                first = normalized not in self._explained
+                self._explained.add(normalized)
+            if first and not many:
+                entry['plan'] = self._explain(conn, sql, parameters)
+            self._append(entry)
+        finally:
+            self._local.busy = False
+        return True
+
+    def _explain(self, conn, sql, parameters):
+        try:
+            return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()]
+        except Exception as e:
+            return [f'(no plan: {e})']
+
+    def _append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode()
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f'{self.path}.1')
+        except OSError:
+            pass
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def entries(self):
+        for path in (f'{self.path}.1', self.path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except OSError:
+                continue
+
+    def top(self, limit=20, sort='total_ms'):
+        """Logged statements grouped by normalized SQL, worst first"""
+        groups = {}
+        for entry in self.entries():
+            group = groups.get(entry['sql'])
+            if group is None:
+                group = groups[entry['sql']] = {
+                    'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'max_rows': 0, 'routes': set(), 'params': entry.get('params'), 'plan': None,
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['ms']
+            group['max_ms'] = max(group['max_ms'], entry['ms'])
+            group['max_rows'] = max(group['max_rows'], entry.get('rows') or 0)
+            group['routes'].add(entry.get('route') or 'background')
+            group['last_seen'] = entry['ts']
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+
+        ranked = sorted(groups.values(), key=lambda g: g[sort], reverse=True)[:limit]
+        for group in ranked:
+            group['routes'] = sorted(group['routes'])
+            group['total_ms'] = round(group['total_ms'], 2)
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+            group['scan'] = any(line.startswith('SCAN') and 'USING' not in line for line in group['plan'] or [])
+        return ranked
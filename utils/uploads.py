@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import os
+import tempfile
+
+from utils.query_plans import hot_query
+
+# Content-addressed upload store. Uploads are hashed (sha256) while they are
+# streamed to disk gzip-compressed, then moved to objects/<aa>/<sha256><ext>.gz,
+# so identical files share one object. The `uploads` table is the manifest:
+# one row per distinct file with its original name, sizes and import result.
+# A file whose content is already queued or imported is not parsed again
+# (except to sync back to it, mode=sync).
+# clients.upload_sha256 records which upload each row came from.
+
+UPLOADS_SCHEMA = '''
+    -- status: queued -> imported | failed (a failed file may be uploaded again)
+    CREATE TABLE IF NOT EXISTS uploads (
+        sha256 TEXT PRIMARY KEY,
+        original_name TEXT NOT NULL,
+        stored_path TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        row_count INTEGER,
+        status TEXT NOT NULL DEFAULT 'queued',
+        duplicate_count INTEGER NOT NULL DEFAULT 0,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        imported_at TIMESTAMP
+    );
+'''
+
+# Rows imported before clients.upload_sha256 existed, for names only one
+# manifest row has
+BACKFILL_SQL = '''
+    UPDATE clients SET upload_sha256 = (SELECT sha256 FROM uploads WHERE original_name = clients.source_file)
+    WHERE upload_sha256 IS NULL AND source_file IN (
+        SELECT original_name FROM uploads GROUP BY original_name HAVING COUNT(*) = 1
+    )
+'''
+
+OBJECTS_DIR = 'objects'
+
+
+class UploadConflict(Exception):
+    pass
+
+
+READ_SIZE = 1024 * 1024
+
+
+def object_path(upload_folder, sha256, ext):
+    return os.path.join(upload_folder, OBJECTS_DIR, sha256[:2], f'{sha256}{ext}.gz')
+
+
+def store_upload(fileobj, upload_folder, original_name):
+    """Stream fileobj into the store; returns (sha256, stored_path, size, stored_size)"""
+    ext = os.path.splitext(original_name)[1].lower()
+    objects = os.path.join(upload_folder, OBJECTS_DIR)
+    os.makedirs(objects, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=objects, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as gz:
+            while True:
+                block = fileobj.read(READ_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                gz.write(block)
+                size += len(block)
+        sha256 = digest.hexdigest()
+        stored_path = object_path(upload_folder, sha256, ext)
+        if os.path.exists(stored_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            os.replace(tmp_path, stored_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, stored_path, size, os.path.getsize(stored_path)
+
+
+def register_upload(conn, sha256, original_name, stored_path, size, stored_size, resync=False):
+    """Add the file to the manifest.
+
+    Returns the existing manifest row (as a dict) when the same content is
+    already queued or imported, so the caller can skip it; None when the file
+    should be imported. With resync (mode=sync) content that was imported
+    before is imported again, since syncing back to an older version of a
+    sheet changes rows; only a copy still queued is skipped.
+    """
+    skip = ('queued',) if resync else ('queued', 'imported')
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT * FROM uploads WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is not None and row['status'] in skip:
+            conn.execute('''
+                UPDATE uploads SET duplicate_count = duplicate_count + 1, last_seen_at = CURRENT_TIMESTAMP
+                WHERE sha256 = ?
+            ''', (sha256,))
+            conn.commit()
+            return dict(row)
+        if row is not None:
+            conn.execute('''
+                UPDATE uploads SET original_name = ?, stored_path = ?, status = 'queued',
+                    row_count = NULL, last_seen_at = CURRENT_TIMESTAMP
+                WHERE sha256 = ?
+            ''', (original_name, stored_path, sha256))
+        else:
+            conn.execute('''
+                INSERT INTO uploads (sha256, original_name, stored_path, size, stored_size)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (sha256, original_name, stored_path, size, stored_size))
+        conn.commit()
+        return None
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def record_import(conn, stored_path, outcome):
+    """Store an ingest outcome on the manifest row (in the caller's transaction)"""
+    if 'error' in outcome:
+        conn.execute("UPDATE uploads SET status = 'failed' WHERE stored_path = ?", (stored_path,))
+    else:
+        conn.execute('''
+            UPDATE uploads SET status = 'imported', row_count = ?, imported_at = CURRENT_TIMESTAMP
+            WHERE stored_path = ?
+        ''', (outcome['rows'], stored_path))
+
+
+def list_uploads(conn):
+    return [dict(row) for row in conn.execute('SELECT * FROM uploads ORDER BY uploaded_at DESC')]
+
+
+DELETE_UPLOAD_ROWS_SQL = hot_query('delete_upload', 'DELETE FROM clients WHERE upload_sha256 = ?', ('x',))
+
+
+def delete_upload(conn, sha256):
+    """Remove a stored file, its manifest row and the clients rows it imported.
+
+    Returns the deleted manifest row, or None if there was none. Raises
+    UploadConflict when rows of the same file name don't say which upload
+    they came from and another upload has that name, so the rows can't be
+    told apart.
+    """
+    row = conn.execute('SELECT * FROM uploads WHERE sha256 = ?', (sha256,)).fetchone()
+    if row is None:
+        return None
+    name = row['original_name']
+    untagged = conn.execute(
+        'SELECT 1 FROM clients WHERE source_file = ? AND upload_sha256 IS NULL LIMIT 1', (name,)
+    ).fetchone()
+    if untagged:
+        shared = conn.execute(
+            'SELECT 1 FROM uploads WHERE original_name = ? AND sha256 != ? LIMIT 1', (name, sha256)
+        ).fetchone()
+        if shared:
+            raise UploadConflict(f"Another upload is also named '{name}'; its rows can't be told apart from this one's")
+        conn.execute('DELETE FROM clients WHERE source_file = ? AND upload_sha256 IS NULL', (name,))
+    conn.execute(DELETE_UPLOAD_ROWS_SQL, (sha256,))
+    conn.execute('DELETE FROM uploads WHERE sha256 = ?', (sha256,))
+    conn.commit()
+    if os.path.exists(row['stored_path']):
+        os.remove(row['stored_path'])
+    return dict(row)
@@ -0,0 +1,75 @@
+import hashlib
+
+from utils.query_plans import hot_query
+
+# Per-table change counters. A trigger on every write to a versioned table
+# bumps its row in table_versions, so any process can tell whether a cached
+# answer built from those tables is still current with one primary-key read,
+# whichever worker (or manage.py, or an ingest job) made the change.
+#
+# The '_epoch' row is random per database, so counters that start again from
+# zero in a recreated database never repeat an old ETag.
+
+VERSION_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+'''
+
+VERSIONED_TABLES = ['projects', 'project_images', 'clients', 'reviews']
+EPOCH = '_epoch'
+
+# Where only some columns are ever read back, updates to the others (import
+# bookkeeping: row_key, row_hash, upload_sha256) leave the counter alone
+VERSIONED_COLUMNS = {
+    'clients': ('business_name', 'location', 'phone', 'anydesk', 'extra_data', 'source_file', 'created_at'),
+}
+
+_BUMP = '''
+    CREATE TRIGGER IF NOT EXISTS version_{table}_{suffix} AFTER {event} ON {table} BEGIN
+        INSERT INTO table_versions (name, version) VALUES ('{table}', 1)
+            ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END;
+'''
+
+
+def version_triggers(table):
+    update = 'UPDATE'
+    if table in VERSIONED_COLUMNS:
+        update += ' OF ' + ', '.join(VERSIONED_COLUMNS[table])
+    return ''.join(
+        _BUMP.format(table=table, suffix=suffix, event=event)
+        for suffix, event in (('ai', 'INSERT'), ('au', update), ('ad', 'DELETE'))
+    )
+
+
+def version_schema(tables):
+    """Counter table, a starting row and the triggers for each table"""
+    script = VERSION_SCHEMA
+    script += f"    INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{EPOCH}', abs(random()));\n"
+    for table in tables:
+        script += f"    INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0);\n"
+        script += version_triggers(table)
+    return script
+
+
+def versions_sql(count):
+    return f"SELECT name, version FROM table_versions WHERE name IN ({', '.join('?' for _ in range(count))})"
+
+
+hot_query('table_versions', versions_sql(3), (EPOCH, 'projects', 'project_images'))
+
+
+def table_versions(conn, *tables):
+    """Current counters for tables, in the order given (0 if never written)"""
+    found = dict(conn.execute(versions_sql(len(tables)), tables).fetchall())
+    return tuple(found.get(table, 0) for table in tables)
+
+
+def data_etag(conn, tables, *key):
+    """Strong ETag for a response built from tables: changes whenever one of
+    them is written, and differs per key (endpoint, arguments, user role)."""
+    versions = table_versions(conn, EPOCH, *tables)
+    raw = repr((versions, key)).encode()
+    return hashlib.sha1(raw).hexdigest()